@@ -0,0 +1,97 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import stats
+
+from mahjongsoul.helper import Games, PlayerPool, Teams
+from mahjongsoul.manager import ContestManager, TournamentLogin
+from mahjongsoul.replay import Recording, ReplayServer
+from mahjongsoul.retry import HostGuard
+from mahjongsoul.standings import Standings
+from mahjongsoul.synthetic import SyntheticContest
+
+STAGES = ["fetch", "ingest", "standings", "tables", "excel"]
+
+def runOnce(endpoint: str, contest_unique_id: str, outdir: str, page_size: int, prefetch: int, rate: float, trace: bool = False):
+    """
+    one pass of the stats.py pipeline against `endpoint`, returns
+    {stage: (seconds, peak bytes or None)}
+    """
+    results = {}
+    @contextlib.contextmanager
+    def stage(name):
+        if trace:
+            tracemalloc.start()
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+        peak = None
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results[name] = (elapsed, peak)
+
+    tz = datetime.timezone(datetime.timedelta(hours=8))
+    teams, players, games = Teams(contest_unique_id), PlayerPool(contest_unique_id), Games(contest_unique_id, tz)
+    # the pipeline's progress messages would drown the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        with stage("fetch"):
+            with TournamentLogin("bench@example.com", "bench", endpoint=endpoint, guard=HostGuard(default_rate=rate)) as api:
+                manager = ContestManager(contest_unique_id, api, "bench")
+                teams_list = stats.loadTeams(manager, teams, players)
+                records = list(manager.iter_logs(page_size=page_size, prefetch=prefetch))
+        with stage("ingest"):
+            games.addGamesFromIter(records)
+        with stage("standings"):
+            standings = Standings.fromGames(players, teams, games)
+        with stage("tables"):
+            tables = stats.buildTables(standings, players, teams, games, teams_list)
+        with stage("excel"):
+            stats.writeReport(os.path.join(outdir, "bench.xlsx"), tables, players, teams, games, datetime.datetime.now(tz=tz))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="time every stage of stats.py offline, against a synthetic contest or a recording")
+    parser.add_argument("--teams", type=int, default=8)
+    parser.add_argument("--players", type=int, default=4, help="players per team")
+    parser.add_argument("--games", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", help="an ApiRecorder file to serve instead of a synthetic contest")
+    parser.add_argument("--contest", default="0", help="contest unique id of the recording")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--prefetch", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=1000, help="calls per second allowed to the stand-in server")
+    parser.add_argument("--json", action="store_true", help="print one json line instead of a table")
+    args = parser.parse_args()
+
+    responder = Recording(args.replay) if args.replay else SyntheticContest(args.teams, args.players, args.games, args.seed)
+    times = {name: [] for name in STAGES}
+    with ReplayServer(responder) as server, tempfile.TemporaryDirectory() as outdir:
+        for _ in range(args.repeat):
+            for name, (elapsed, _) in runOnce(server.endpoint, args.contest, outdir, args.page_size, args.prefetch, args.rate).items():
+                times[name].append(elapsed)
+        # peak memory comes from a separate traced pass, tracing slows everything down
+        peaks = {name: peak for name, (_, peak) in runOnce(server.endpoint, args.contest, outdir, args.page_size, args.prefetch, args.rate, trace=True).items()}
+
+    if args.json:
+        print(json.dumps({
+            "config": {k: v for k, v in vars(args).items() if k != "json"},
+            "stages": {name: {"best": min(times[name]), "median": statistics.median(times[name]), "peak_bytes": peaks[name]} for name in STAGES},
+        }))
+        return
+    print(f"{'stage':<10}{'best (s)':>12}{'median (s)':>12}{'peak (MiB)':>12}")
+    for name in STAGES:
+        print(f"{name:<10}{min(times[name]):>12.4f}{statistics.median(times[name]):>12.4f}{peaks[name] / 2**20:>12.2f}")
+    print(f"{'total':<10}{sum(min(t) for t in times.values()):>12.4f}")
+
+if __name__ == "__main__":
+    main()
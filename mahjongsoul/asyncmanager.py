@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from typing import *
+
+import aiohttp
+
+from .codec import loads
+from .manager import HOST_FAILURES, TournamentAPI, response_data, running_season_id
+from .retry import CONNECT, DECODE, NETWORK, classify, retry_after
+
+class AsyncTournamentAPI:
+    """
+    aiohttp counterpart of `TournamentAPI`. Shares the headers (and therefore
+    the login token) of a logged in `TournamentAPI`, and caps the number of
+    requests in flight with `max_concurrency`.
+
+    asyncio and aiohttp are slow to import and the admin commands never need
+    them, so this module is only imported by the commands that fetch
+    concurrently
+    """
+    def __init__(self, api: TournamentAPI, max_concurrency: int = 8):
+        self.api = api
+        self.logger = api.logger
+        self.endpoint = api.endpoint
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency), timeout=aiohttp.ClientTimeout(total=self.api.timeout))
+        return self.session
+
+    async def request(self, http_method: str, method: str, endpoint: str = "", second_try: bool = False, params: Dict = {}, data: Optional[Dict] = None):
+        url = (endpoint or self.endpoint) + method
+        guard = self.api.guard
+        host = guard.host(url)
+        attempt = 0
+        while True:
+            attempt += 1
+            if not guard.breaker(host).allow():
+                self.api.observe_call(method, "circuit_open", time.perf_counter())
+                self.logger.info(f"{method} not sent, too many failures on {host}")
+                return None
+            await asyncio.sleep(guard.bucket(host).reserve())
+            authorization = self.api.headers.get("Authorization")
+            kind, response, wait = await self.send(http_method, method, url, params, data)
+            guard.breaker(host).record(kind not in HOST_FAILURES)
+            if kind is None:
+                if self.api.recorder is not None:
+                    self.api.recorder.record(http_method, method, params, data, response)
+                return response
+            action, delay = self.api.next_step(http_method, method, kind, attempt, second_try, wait)
+            if action == "fail":
+                return None
+            if action == "relogin":
+                second_try = True
+                # single-flight, concurrent failures share one login
+                await asyncio.to_thread(self.api.relogin, authorization)
+            else:
+                await asyncio.sleep(delay)
+    async def send(self, http_method: str, method: str, url: str, params: Dict, data: Optional[Dict]) -> Tuple[Optional[str], Any, Optional[float]]:
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                async with self.get_session().request(http_method, url, params=params, headers=self.api.headers, json=data) as res:
+                    status = res.status
+                    headers = res.headers
+                    body = await res.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.api.observe_call(method, "error", started, data)
+                self.logger.info(f"{method} failed: {e!r}")
+                return (CONNECT if isinstance(e, aiohttp.ClientConnectorError) else NETWORK), None, None
+        self.api.observe_call(method, status, started, data, len(body))
+        if (kind := classify(status)) is not None:
+            return kind, None, retry_after(headers.get("Retry-After"))
+        try:
+            return None, loads(body), None
+        except ValueError as e:
+            self.logger.info(f"{method} returned an invalid response: {e!r}")
+            return DECODE, None, None
+    async def get(self, method: str, endpoint: str = "", second_try: bool = False, **params):
+        # aiohttp refuses None query values, requests silently drops them
+        params = {k: v for k, v in params.items() if v is not None}
+        return await self.request("GET", method, endpoint, second_try, params=params)
+    async def post(self, method: str, params: Dict = {}, endpoint: str = "", second_try: bool = False, **data):
+        return await self.request("POST", method, endpoint, second_try, params=params, data=data)
+
+class AsyncContestManager:
+    """
+    asyncio version of the read-only `ContestManager` calls. Methods keep the
+    same names and arguments as their `ContestManager` counterparts but have
+    to be awaited. Pass `season_id` to skip the season lookup, otherwise call
+    `get_current_season` before anything else.
+    """
+    def __init__(self, contest_unique_id: int, api: AsyncTournamentAPI, game_type: str, season_id: Optional[int] = None):
+        self.contest_unique_id = contest_unique_id
+        self.api = api
+        self.game_type = game_type
+        self.logger = logging.getLogger(game_type)
+        self.season_id = season_id or 1
+    async def get_current_season(self):
+        res = await self.api.get(method=f"contest/fetch_contest_season_list", unique_id=str(self.contest_unique_id))
+        self.season_id = running_season_id(response_data(res))
+        return self.season_id
+    async def get_all_players_stats_card(self, offset=0, limit=20):
+        return response_data(await self.api.get(method="contest/contest_season_player_list", unique_id=self.contest_unique_id, season_id=self.season_id, search=None, state=2, offset=offset, limit=limit))
+    async def get_player_stats_card(self, account_id):
+        return response_data(await self.api.get(method="contest/fetch_season_player_data", unique_id=self.contest_unique_id, season_id=self.season_id, account_id=account_id))
+    async def get_teams(self, offset=0, limit=300):
+        return response_data(await self.api.get(method="contest/fetch_contest_team_list", unique_id=self.contest_unique_id, season_id=self.season_id, offset=offset, limit=limit))
+    async def get_team_members(self, team_id, offset=0, limit=10):
+        return response_data(await self.api.post(method="contest/fetch_contest_team_member_list", unique_id=str(self.contest_unique_id), season_id=self.season_id, team_id=team_id, offset=offset, limit=limit))
+    async def get_all_team_members(self, team_ids: List[int], offset=0, limit=10) -> List[Dict]:
+        """
+        fetch the member lists of every team in `team_ids` concurrently
+        (bounded by the api's `max_concurrency`), returned in the same order
+        as `team_ids`
+        """
+        return list(await asyncio.gather(*[self.get_team_members(team_id=t, offset=offset, limit=limit) for t in team_ids]))
+    async def get_logs(self, offset=0, limit=10):
+        return response_data(await self.api.get(method="contest/fetch_contest_game_records", unique_id=self.contest_unique_id, season_id=self.season_id, offset=offset, limit=limit))
+    async def poll_participants(self) -> List[Dict]:
+        return response_data(await self.api.get(method="contest/ready_player_list", unique_id=self.contest_unique_id, season_id=self.season_id))
+    async def poll_match_list(self) -> List[Dict]:
+        return response_data(await self.api.get(method="contest/contest_running_game_list", unique_id=self.contest_unique_id, season_id=self.season_id))
+    async def poll_match(self, uuid: str) -> Dict:
+        return await self.api.get(method=f"game/realtime/{uuid}/progress/latest", endpoint="https://contesten.mahjongsoul.com:7443/api/")
@@ -0,0 +1,17 @@
+import json
+
+from typing import *
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    json.loads, through orjson when it is installed. both raise a ValueError
+    on invalid json
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
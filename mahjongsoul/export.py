@@ -0,0 +1,94 @@
+import importlib
+import pandas as pd
+
+from abc import ABC, abstractmethod
+from typing import *
+
+class Exporter(ABC):
+    """
+    writes named tables (standings, team totals, game log...) to one file
+    per table, `{basename}_{table}{extension}`
+    """
+    extension = ""
+    # optional packages the format needs, checked by `parseFormats`
+    requires: Tuple[str, ...] = ()
+
+    def write(self, tables: Dict[str, pd.DataFrame], basename: str) -> List[str]:
+        filenames = []
+        for name, df in tables.items():
+            filename = f"{basename}_{name}{self.extension}"
+            self.writeTable(df, filename)
+            filenames.append(filename)
+        return filenames
+
+    @abstractmethod
+    def writeTable(self, df: pd.DataFrame, filename: str):
+        pass
+
+class CsvExporter(Exporter):
+    extension = ".csv"
+
+    def writeTable(self, df: pd.DataFrame, filename: str):
+        # utf-8-sig so that Excel opens the Chinese headers correctly
+        df.to_csv(filename, index=df.index.name is not None, encoding="utf-8-sig")
+
+class JsonExporter(Exporter):
+    extension = ".json"
+
+    def writeTable(self, df: pd.DataFrame, filename: str):
+        if df.index.name is not None:
+            df = df.reset_index()
+        df.to_json(filename, orient="records", force_ascii=False, indent=1)
+
+class ParquetExporter(Exporter):
+    """
+    needs pyarrow
+    """
+    extension = ".parquet"
+    requires = ("pyarrow",)
+
+    def writeTable(self, df: pd.DataFrame, filename: str):
+        df.to_parquet(filename, index=df.index.name is not None)
+
+class ArrowExporter(Exporter):
+    """
+    Arrow IPC (feather v2) files that can be memory-mapped by the reader,
+    needs pyarrow
+    """
+    extension = ".arrow"
+    requires = ("pyarrow",)
+
+    def writeTable(self, df: pd.DataFrame, filename: str):
+        if df.index.name is not None:
+            df = df.reset_index()
+        df.to_feather(filename)
+
+EXPORTERS: Dict[str, Type[Exporter]] = {
+    "csv": CsvExporter,
+    "json": JsonExporter,
+    "parquet": ParquetExporter,
+    "arrow": ArrowExporter,
+}
+
+def parseFormats(formats: Optional[str], default: str = "xlsx") -> List[str]:
+    """
+    comma separated list of output formats, "xlsx" or any key of `EXPORTERS`.
+    fails on a format whose packages are missing, before any work is done
+    """
+    formats = [f.strip().lower() for f in (formats or default).split(",") if f.strip()]
+    for f in formats:
+        if f != "xlsx" and f not in EXPORTERS:
+            raise ValueError(f"unknown output format {f!r}, expected xlsx or one of {', '.join(EXPORTERS)}")
+        for module in EXPORTERS[f].requires if f in EXPORTERS else ():
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                raise ValueError(f"output format {f!r} needs {module}, which is not installed") from None
+    return formats
+
+def exportTables(tables: Dict[str, pd.DataFrame], basename: str, formats: Iterable[str]) -> List[str]:
+    filenames = []
+    for f in formats:
+        if f in EXPORTERS:
+            filenames += EXPORTERS[f]().write(tables, basename)
+    return filenames
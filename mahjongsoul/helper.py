@@ -1,9 +1,9 @@
-import asyncio
+import itertools
 import json
 import typing
-import pandas as pd
+import numpy as np
 
-from datetime import datetime, tzinfo, timedelta
+from datetime import date, datetime, tzinfo, timedelta
 from os.path import join, dirname
 
 class CNTZ(tzinfo):
@@ -16,21 +16,64 @@ class CNTZ(tzinfo):
     def  __repr__(self):
         return f"{self.__class__.__name__}()"
 
+# shared by every game and game log that isn't given a timezone of its own
+CONTEST_TZ = CNTZ()
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+START_POINTS = 25000
+UMA = [45000,5000,-15000,-35000]
+
+def splitTies(part_points: np.ndarray, total_points: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    for games shaped (n_games, 4): the placement of every player (0 for
+    first, players on the same score share the better one), the total points
+    with every group of tied players sharing the average of theirs, and
+    which players are tied
+    """
+    same = part_points[:, :, None] == part_points[:, None, :]
+    places = (part_points[:, None, :] > part_points[:, :, None]).sum(axis=2)
+    tie_size = same.sum(axis=2)
+    shared = (same * total_points[:, None, :]).sum(axis=2) / tie_size
+    return places, shared, tie_size > 1
+
 class Player:
+    """
+    account_data's `recent_games` are folded into the aggregates the stats
+    need (placements, best game, point sums) and not kept
+    """
+    __slots__ = ("dyyId", "mjsId", "nickname", "team", "total_game_count", "rank_pt", "rank_count",
+                 "highest", "point_sum", "point_sq_sum", "point_games")
+
     def __init__(self, player_data, team = None):
         self.dyyId = None
         self.mjsId = player_data['account_id']
         self.nickname = player_data['nickname']
         self.team = team or ""
-        self.total_game_count = player_data['account_data']['total_game_count']
-        self.games = player_data['account_data']['recent_games']
-        self.rank_pt = player_data["account_data"]['accumulate_point']
-        self.rank, self.rank_count = self.__getRank()
-    
-    def __getRank(self):
-        rank_freq = [int(t['rank']) for t in self.games]
-        rank = {x: rank_freq.count(x) for x in range(1,5)}
-        return rank, list(rank.values())
+        # account_data is only needed when stats are not rebuilt from the game log
+        account_data = player_data.get('account_data') or {}
+        if isinstance(account_data, str):
+            account_data = json.loads(account_data)
+        self.total_game_count = account_data.get('total_game_count', 0)
+        self.rank_pt = account_data.get('accumulate_point', 0)
+        self.__addRecentGames(account_data.get('recent_games', []))
+    
+    def __addRecentGames(self, games):
+        self.rank_count = [0, 0, 0, 0]
+        self.highest = 0
+        self.point_sum = 0.0
+        self.point_sq_sum = 0.0
+        self.point_games = len(games)
+        for i, game in enumerate(games):
+            rank = int(game['rank'])
+            self.rank_count[rank-1] += 1
+            game_points = int(game["total_point"]) - UMA[rank-1] + START_POINTS
+            self.highest = game_points if i == 0 else max(self.highest, game_points)
+            self.point_sum += int(game["total_point"]) / 1000
+            self.point_sq_sum += (int(game["total_point"]) / 1000)**2
+    
+    @property
+    def rank(self):
+        return dict(zip(range(1,5), self.rank_count))
     
     def setDyyId(self, dyyId):
         self.dyyId = dyyId
@@ -39,9 +82,7 @@ class Player:
         self.team = team_name
     
     def getHighestGamePoints(self):
-        start = 25000
-        uma = [45000,5000,-15000,-35000]
-        return max([game["total_point"]-uma[game["rank"]-1]+start for game in self.games]) if len(self.games) != 0 else 0
+        return self.highest
     
     def getTop(self):
         return (self.rank_count[0]) / self.total_game_count if self.total_game_count != 0 else 0
@@ -68,70 +109,191 @@ class Player:
     def __repr__(self):
         return str({'_id': self.dyyId, 'mahjongSoulId': self.mjsId, 'nickname': self.nickname})
 
+class PlayerStats:
+    """
+    statistics of a whole list of players computed at once, either from each
+    player's account data (`fromPlayers`) or straight from the game log
+    (`fromGames`). `fromPlayers` stacks the aggregates every `Player` keeps
+    (placement counts, best game, point sums), `fromGames` flattens every
+    seat of the log into arrays tagged with the player's row. either way
+    each metric is a single vectorized pass instead of one python loop per
+    player per metric.
+    """
+    def __init__(self, rank_pt, total_game_count, rank_count, highest, point_sum, point_sq_sum, point_games):
+        self.rank_pt = rank_pt
+        self.total_game_count = total_game_count
+        self.rank_count = rank_count
+        self.highest = highest
+        self.point_sum = point_sum
+        self.point_sq_sum = point_sq_sum
+        self.point_games = point_games
+
+        # division by zero games is reported as 0, as in Player
+        played = self.total_game_count != 0
+        denom = np.where(played, self.total_game_count, 1)
+        cumulative = np.cumsum(self.rank_count, axis=1)
+        self.top = np.where(played, cumulative[:, 0] / denom, 0)
+        self.rentai = np.where(played, cumulative[:, 1] / denom, 0)
+        self.avoid_4th = np.where(played, cumulative[:, 2] / denom, 0)
+        self.avg_placement = np.where(played, (self.rank_count @ np.arange(1, 5)) / denom, 0)
+        placements = np.maximum(cumulative[:, 3], 1)
+        self.rank_variance = np.where(cumulative[:, 3] > 0, (self.rank_count @ np.arange(1, 5)**2) / placements - ((self.rank_count @ np.arange(1, 5)) / placements)**2, 0)
+
+        games = np.maximum(point_games, 1)
+        self.point_stddev = np.where(point_games > 0, np.sqrt(np.maximum(point_sq_sum / games - (point_sum / games)**2, 0)), 0)
+    
+    def exportToDict(self, extended=False):
+        data = {
+            "积分": (self.rank_pt / 1000).tolist(),
+            "试合数": self.total_game_count.tolist(),
+            "平顺": self.avg_placement.tolist(),
+            "1着": self.rank_count[:, 0].tolist(),
+            "2着": self.rank_count[:, 1].tolist(),
+            "3着": self.rank_count[:, 2].tolist(),
+            "4着": self.rank_count[:, 3].tolist(),
+            "TOP率": self.top.tolist(),
+            "连对率": self.rentai.tolist(),
+            "避四率": self.avoid_4th.tolist(),
+            "最高分": self.highest.tolist(),
+        }
+        if extended:
+            data["顺位方差"] = self.rank_variance.tolist()
+            data["积分标准差"] = self.point_stddev.tolist()
+        return data
+    
+    @classmethod
+    def fromPlayers(cls, players: list[Player]):
+        """
+        from `recent_games` / `accumulate_point` of each player's account
+        data, including tie adjustments made through `Player.modifyRankCount`
+        and `Player.modifyRankPt`
+        """
+        n = len(players)
+        return cls(
+            rank_pt=np.fromiter((p.rank_pt for p in players), dtype=np.float64, count=n),
+            total_game_count=np.fromiter((p.total_game_count for p in players), dtype=np.int64, count=n),
+            rank_count=np.array([p.rank_count for p in players], dtype=np.int64).reshape(n, 4),
+            highest=np.fromiter((p.highest for p in players), dtype=np.int64, count=n),
+            point_sum=np.fromiter((p.point_sum for p in players), dtype=np.float64, count=n),
+            point_sq_sum=np.fromiter((p.point_sq_sum for p in players), dtype=np.float64, count=n),
+            point_games=np.fromiter((p.point_games for p in players), dtype=np.int64, count=n),
+        )
+    
+    @classmethod
+    def fromGames(cls, account_ids: list[int], games: "Games"):
+        """
+        from the game log alone, in one pass over every seat of every game.
+        tied players share the better placement and the averaged points
+        already stored in `games`; seats of accounts not in `account_ids`
+        are ignored.
+        """
+        n = len(account_ids)
+        if n == 0:
+            # nothing to look the seats up in
+            return cls.fromPlayers([])
+        pool_ids = np.asarray(account_ids, dtype=np.int64)
+        part_points = games.part_points
+        # placement = 1 + number of players with a strictly higher score at the same table
+        ranks = (1 + (part_points[:, None, :] > part_points[:, :, None]).sum(axis=2)).ravel()
+        seat_ids = games.account_ids.ravel()
+        seat_parts = part_points.ravel()
+        seat_totals = games.total_points.ravel()
+
+        sorter = np.argsort(pool_ids, kind="stable")
+        pos = np.minimum(np.searchsorted(pool_ids, seat_ids, sorter=sorter), n - 1)
+        known = pool_ids[sorter[pos]] == seat_ids
+        owner = sorter[pos][known]
+        ranks, seat_parts, seat_totals = ranks[known], seat_parts[known], seat_totals[known]
+
+        game_count = np.bincount(owner, minlength=n)
+        highest = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(highest, owner, seat_parts)
+        highest[game_count == 0] = 0
+
+        return cls(
+            rank_pt=np.bincount(owner, weights=seat_totals, minlength=n).astype(np.float64),
+            total_game_count=game_count,
+            rank_count=np.bincount(owner * 4 + ranks - 1, minlength=4 * n).reshape(n, 4),
+            highest=highest,
+            point_sum=np.bincount(owner, weights=seat_totals / 1000, minlength=n),
+            point_sq_sum=np.bincount(owner, weights=(seat_totals / 1000)**2, minlength=n),
+            point_games=game_count,
+        )
+
 class PlayerPool:
     def __init__(self, contestId):
         self.contestId = contestId
         self.players: list[Player] = []
+        # lookup indexes, first player added wins on duplicate keys (same as list.index)
+        self.nickname_index: dict[str, Player] = {}
+        self.account_index: dict[int, Player] = {}
     
     def addPlayer(self, player: Player):
         self.players.append(player)
+        self.nickname_index.setdefault(player.nickname, player)
+        self.account_index.setdefault(player.mjsId, player)
     
     def addPlayerFromDict(self, player_data):
-        self.players.append(Player(player_data))
+        self.addPlayer(Player(player_data))
     
-    def assignPlayerToTeam(self, nickname, team_name):
-        try:
-            idx = [p.nickname for p in self.players].index(nickname)
-            self.players[idx].setTeam(team_name)
-        except ValueError as e:
-            print("Player not found.")
+    def getPlayer(self, nickname):
+        return self.nickname_index.get(nickname)
+    
+    def getPlayerById(self, account_id):
+        return self.account_index.get(account_id)
+    
+    def getNickname(self, account_id, default=""):
+        player = self.account_index.get(account_id)
+        return player.nickname if player is not None else default
     
-    def modifyPlayerPt(self, nickname, modifier):
-        try:
-            idx = [p.nickname for p in self.players].index(nickname)
-            self.players[idx].modifyRankPt(modifier)
-        except ValueError as e:
+    def assignPlayerToTeam(self, account_id, team_name):
+        if (player := self.account_index.get(account_id)) is None:
             print("Player not found.")
+            return
+        player.setTeam(team_name)
     
-    def modifyPlayerRank(self, nickname, rank: tuple):
-        try:
-            idx = [p.nickname for p in self.players].index(nickname)
-            old, new = rank
-            self.players[idx].modifyRankCount(old, new)
-        except ValueError as e:
+    def modifyPlayerPt(self, account_id, modifier):
+        if (player := self.account_index.get(account_id)) is None:
             print("Player not found.")
+            return
+        player.modifyRankPt(modifier)
     
-    def exportToDict(self):
-        data_cols = ["队伍","选手","积分","试合数","平顺","1着","2着","3着","4着","TOP率","连对率","避四率","最高分"]
-        data = {a: [] for a in data_cols}
-
-        for player in self.players:
-            data["队伍"].append(player.team)
-            data["选手"].append(player.nickname)
-            data["积分"].append(player.rank_pt / 1000)
-            data["试合数"].append(player.total_game_count)
-            data["平顺"].append(player.getAvgPlacement())
-            data["1着"].append(player.rank_count[0])
-            data["2着"].append(player.rank_count[1])
-            data["3着"].append(player.rank_count[2])
-            data["4着"].append(player.rank_count[3])
-            data["TOP率"].append(player.getTop())
-            data["连对率"].append(player.getRentai())
-            data["避四率"].append(player.get4thAvoidance())
-            data["最高分"].append(player.getHighestGamePoints())
-        
+    def modifyPlayerRank(self, account_id, rank: tuple):
+        if (player := self.account_index.get(account_id)) is None:
+            print("Player not found.")
+            return
+        old, new = rank
+        player.modifyRankCount(old, new)
+    
+    def exportToDict(self, games: "Games" = None, extended=False):
+        """
+        with `games`, every number is rebuilt from the game log (ties
+        included) instead of the players' account data. `extended` adds the
+        placement variance and the per-game point standard deviation
+        """
+        if games is not None:
+            stats = PlayerStats.fromGames([p.mjsId for p in self.players], games)
+        else:
+            stats = PlayerStats.fromPlayers(self.players)
+        data = {
+            "队伍": [p.team for p in self.players],
+            "选手": [p.nickname for p in self.players],
+        }
+        data.update(stats.exportToDict(extended))
         return data
 
 
 class Team:
+    __slots__ = ("dyyId", "name", "players", "color")
+
     def __init__(self, dyyId, name, players, color=None):
         self.dyyId = dyyId
         self.name = name
-        self.players: list[str] = players
+        self.players: list[int] = players
         self.color = color
     
-    def inTeam(self, nickname):
-        return nickname in self.players
+    def inTeam(self, account_id):
+        return account_id in self.players
 
     def __str__(self):
         return str({"name": self.name, "players": self.players})
@@ -143,48 +305,80 @@ class Teams:
     def __init__(self, contestId):
         self.contestId = contestId
         self.teams: list[Team] = []
+        self.name_index: dict[str, Team] = {}
+        self.account_index: dict[int, Team] = {}
     
     def addTeam(self, team: Team):
         self.teams.append(team)
-    
-    def getPlayerTeam(self, nickname):
-        for t in self.teams:
-            if t.inTeam(nickname):
-                return t.name
-        return ""
+        self.name_index.setdefault(team.name, team)
+        for account_id in team.players:
+            self.account_index.setdefault(account_id, team)
+    
+    def getTeam(self, team_name):
+        return self.name_index.get(team_name)
+    
+    def assignPlayerToTeam(self, account_id, team_name):
+        if (team := self.name_index.get(team_name)) is None:
+            print("Team not found.")
+            return
+        if (old_team := self.account_index.get(account_id)) is not None:
+            old_team.players.remove(account_id)
+        team.players.append(account_id)
+        self.account_index[account_id] = team
+    
+    def getPlayerTeam(self, account_id):
+        team = self.account_index.get(account_id)
+        return team.name if team is not None else ""
 
 class Game:
+    """
+    one game, players in seat order as {"account_id", "seat", "nickname",
+    "part_point_1", "total_point"} with tie-split points. built from a
+    record of the contest api without modifying or keeping it
+    """
+    __slots__ = ("uuid", "tz", "modified", "players", "start_time", "end_time")
+
     def __init__(self, game_data, tz: tzinfo = None):
         self.uuid = game_data['uuid']
-        self.tz = tz or CNTZ()
+        self.tz = tz or CONTEST_TZ
         self.modified = {}
         self.players = self.__addPlayers(game_data)
         self.start_time = datetime.fromtimestamp(game_data['start_time'], tz=self.tz)
         self.end_time = datetime.fromtimestamp(game_data['end_time'], tz=self.tz)
     
     def __addPlayers(self,game_data):
-        account = sorted(game_data['accounts'], key=lambda x:x['seat'])
-        for j,k in zip([0,1,2],[1,2,3]):
-            # Share points in case of tie
-            if game_data['result']['players'][j]["part_point_1"] == game_data['result']['players'][k]["part_point_1"]:
-                new_point = (game_data['result']['players'][j]["total_point"]+game_data['result']['players'][k]["total_point"]) / 2
-                player1 = [x['nickname'] for x in account if game_data['result']['players'][j]['seat'] == x['seat']][0]
-                self.modified[player1] = {"point": new_point - game_data['result']['players'][j]["total_point"], "rank": (j, j)}
-                game_data['result']['players'][j]["total_point"] = new_point
-                player2 = [x['nickname'] for x in account if game_data['result']['players'][k]['seat'] == x['seat']][0]
-                self.modified[player2] = {"point": new_point - game_data['result']['players'][k]["total_point"], "rank": (k, j)}
-                game_data['result']['players'][k]["total_point"] = new_point
-        for i in range(4):
-            result = [p for p in game_data['result']['players'] if p['seat'] == i][0]
-            account[i]["part_point_1"] = result["part_point_1"]
-            account[i]["total_point"] = result["total_point"]
-        return account
-    
-    def getPlayerData(self, nickname):
-        return [p for p in self.players if p['nickname'] == nickname]
-    
-    def hasPlayed(self, nickname):
-        return len([p for p in self.players if p['nickname'] == nickname]) == 1
+        results = game_data['result']['players']
+        account = {x['seat']: x for x in game_data['accounts']}
+        # Share points in case of tie
+        places, shared, tied = splitTies(np.array([[p["part_point_1"] for p in results]]),
+                                         np.array([[p["total_point"] for p in results]], dtype=np.float64))
+        players = [None] * 4
+        for k, result in enumerate(results):
+            seat = result['seat']
+            total_point = result["total_point"]
+            if tied[0, k]:
+                total_point = float(shared[0, k])
+                self.modified[account[seat]['account_id']] = {"point": total_point - result["total_point"], "rank": (k, int(places[0, k]))}
+            players[seat] = {"account_id": account[seat]['account_id'], "seat": seat, "nickname": account[seat].get('nickname', ""),
+                             "part_point_1": result["part_point_1"], "total_point": total_point}
+        return players
+    
+    @classmethod
+    def fromColumns(cls, uuid, start_time: int, end_time: int, players: list[dict], tz: tzinfo = None):
+        game = cls.__new__(cls)
+        game.uuid = uuid
+        game.tz = tz or CONTEST_TZ
+        game.modified = {}
+        game.players = players
+        game.start_time = datetime.fromtimestamp(start_time, tz=game.tz)
+        game.end_time = datetime.fromtimestamp(end_time, tz=game.tz)
+        return game
+    
+    def getPlayerData(self, account_id):
+        return [p for p in self.players if p['account_id'] == account_id]
+    
+    def hasPlayed(self, account_id):
+        return len([p for p in self.players if p['account_id'] == account_id]) == 1
     
     def hasModified(self):
         return len(self.modified) > 0
@@ -193,63 +387,246 @@ class Game:
         return self.start_time.date() == time.date()
 
 class Games:
-    def __init__(self, contestId):
+    """
+    columnar game log. every per-game field lives in a numpy array with one
+    row per game (in insertion order, i.e. newest first when fed from the
+    contest api) and per-seat fields are shaped (n_games, 4) in seat order.
+    lookups return arrays of row indices, `getGame` rebuilds a `Game` view
+    of a single row when one is needed.
+    """
+    def __init__(self, contestId, tz: tzinfo = None):
         self.contestId = contestId
-        self.game_list: list[Game] = []
+        self.tz = tz or CONTEST_TZ
         self.modified = {}
+        self.uuids: list[str] = []
+        self.uuid_index: dict[str, int] = {}
+        # most recent nickname recorded for each account id, only used for rendering
+        self.nicknames: dict[int, str] = {}
+        self.size = 0
+        self.__start_time = np.zeros(0, dtype=np.int64)
+        self.__end_time = np.zeros(0, dtype=np.int64)
+        self.__account_id = np.zeros((0, 4), dtype=np.int64)
+        self.__part_point = np.zeros((0, 4), dtype=np.int64)
+        self.__total_point = np.zeros((0, 4), dtype=np.float64)
+        # rows sorted by start time and their start times, covering rows [0, __indexed)
+        self.__time_order = np.zeros(0, dtype=np.int64)
+        self.__time_sorted = np.zeros(0, dtype=np.int64)
+        self.__indexed = 0
+    
+    def __len__(self):
+        return self.size
+    
+    @property
+    def start_times(self) -> np.ndarray:
+        return self.__start_time[:self.size]
+    
+    @property
+    def end_times(self) -> np.ndarray:
+        return self.__end_time[:self.size]
+    
+    @property
+    def account_ids(self) -> np.ndarray:
+        return self.__account_id[:self.size]
+    
+    @property
+    def part_points(self) -> np.ndarray:
+        return self.__part_point[:self.size]
+    
+    @property
+    def total_points(self) -> np.ndarray:
+        return self.__total_point[:self.size]
+    
+    @property
+    def game_list(self) -> list[Game]:
+        return [self.getGame(i) for i in range(self.size)]
+    
+    def __reserve(self, n):
+        if n <= len(self.__start_time):
+            return
+        capacity = max(n, 2 * len(self.__start_time), 256)
+        def grow(arr):
+            new = np.zeros((capacity,) + arr.shape[1:], dtype=arr.dtype)
+            new[:self.size] = arr[:self.size]
+            return new
+        self.__start_time = grow(self.__start_time)
+        self.__end_time = grow(self.__end_time)
+        self.__account_id = grow(self.__account_id)
+        self.__part_point = grow(self.__part_point)
+        self.__total_point = grow(self.__total_point)
     
     def addGame(self, game: Game):
-        self.game_list.append(game)
-        self.__addModified(game)
+        if game.uuid in self.uuid_index:
+            return
+        self.__reserve(self.size + 1)
+        i = self.size
+        self.__start_time[i] = int(game.start_time.timestamp())
+        self.__end_time[i] = int(game.end_time.timestamp())
+        for seat, p in enumerate(game.players):
+            self.__account_id[i, seat] = p["account_id"]
+            self.__part_point[i, seat] = p["part_point_1"]
+            self.__total_point[i, seat] = p["total_point"]
+            self.nicknames.setdefault(p["account_id"], p.get("nickname") or "")
+        self.uuids.append(game.uuid)
+        self.uuid_index[game.uuid] = i
+        self.size += 1
+        for account_id, v in game.modified.items():
+            self.modified.setdefault(account_id, []).append(v)
     
     def addGameFromDict(self, game_data):
-        self.game_list.append(game := Game(game_data))
-        self.__addModified(game)
-    
-    def __addModified(self, game: Game):
-        if game.hasModified():
-            for k, v in game.modified.items():
-                if k in self.modified:
-                    self.modified[k].append(v)
-                else:
-                    self.modified[k] = [v]
+        self.addGamePage([game_data])
+    
+    def addGamePage(self, records: typing.Sequence[dict]):
+        """
+        add a page of game records (a `record_list` of the contest api) in one
+        go: seats are filled in by seat number straight into flat lists, and
+        the ties of the whole page are split with array operations. records
+        whose uuid has been added already are skipped
+        """
+        fresh = {}
+        for game_data in records:
+            if game_data['uuid'] not in self.uuid_index:
+                fresh.setdefault(game_data['uuid'], game_data)
+        if not (n := len(fresh)):
+            return
+        account_ids, part_points, total_points, result_order = [0] * (4 * n), [0] * (4 * n), [0] * (4 * n), [0] * (4 * n)
+        for i, game_data in enumerate(fresh.values()):
+            row = 4 * i
+            for a in game_data['accounts']:
+                account_ids[row + a['seat']] = a['account_id']
+                self.nicknames.setdefault(a['account_id'], a.get('nickname') or "")
+            for k, p in enumerate(game_data['result']['players']):
+                seat = row + p['seat']
+                part_points[seat] = p['part_point_1']
+                total_points[seat] = p['total_point']
+                result_order[seat] = k
+        account_ids = np.array(account_ids, dtype=np.int64).reshape(n, 4)
+        part_points = np.array(part_points, dtype=np.int64).reshape(n, 4)
+        total_points = np.array(total_points, dtype=np.float64).reshape(n, 4)
+        places, shared, tied = splitTies(part_points, total_points)
 
-    
-    def getGameFromUuid(self, uuid):
-        return [g for g in self.game_list if g.uuid == uuid]
-    
-    def getPlayerGames(self, nickname):
-        return [g for g in self.game_list if g.hasPlayed(nickname)]
-    
-    def getGameFromTime(self, time: datetime):
-        return [g for g in self.game_list if g.hasSameDate(time)]
+        self.__reserve(self.size + n)
+        rows = slice(self.size, self.size + n)
+        self.__start_time[rows] = np.fromiter((r['start_time'] for r in fresh.values()), dtype=np.int64, count=n)
+        self.__end_time[rows] = np.fromiter((r['end_time'] for r in fresh.values()), dtype=np.int64, count=n)
+        self.__account_id[rows] = account_ids
+        self.__part_point[rows] = part_points
+        self.__total_point[rows] = shared
+        for i, uuid in enumerate(fresh, self.size):
+            self.uuids.append(uuid)
+            self.uuid_index[uuid] = i
+        for i, seat in zip(*np.nonzero(tied)):
+            self.modified.setdefault(int(account_ids[i, seat]), []).append({
+                "point": float(shared[i, seat] - total_points[i, seat]),
+                "rank": (result_order[4 * i + seat], int(places[i, seat])),
+            })
+        self.size += n
+    
+    def addGamesFromIter(self, records: typing.Iterable[dict], batch_size: int = 500):
+        # records are consumed a batch at a time so a paged fetch never has to be held in full
+        records = iter(records)
+        while batch := list(itertools.islice(records, batch_size)):
+            self.addGamePage(batch)
+
+    def getGame(self, idx) -> Game:
+        return Game.fromColumns(
+            self.uuids[idx], int(self.__start_time[idx]), int(self.__end_time[idx]),
+            [{"account_id": int(a), "seat": seat, "nickname": self.nicknames.get(int(a), ""), "part_point_1": int(pp), "total_point": float(tp)}
+             for seat, (a, pp, tp) in enumerate(zip(self.__account_id[idx], self.__part_point[idx], self.__total_point[idx]))],
+            self.tz
+        )
+    
+    def getGameFromUuid(self, uuid) -> np.ndarray:
+        return np.array([self.uuid_index[uuid]] if uuid in self.uuid_index else [], dtype=np.int64)
+    
+    def getPlayerGames(self, account_id) -> np.ndarray:
+        return np.flatnonzero((self.account_ids == account_id).any(axis=1))
+    
+    def __timeIndex(self):
+        # rows are only ever appended, so merge the ones added since the last query into the sorted index
+        if self.__indexed < self.size:
+            new_rows = np.arange(self.__indexed, self.size)
+            new_rows = new_rows[np.argsort(self.__start_time[new_rows], kind="stable")]
+            new_times = self.__start_time[new_rows]
+            pos = np.searchsorted(self.__time_sorted, new_times, side="right")
+            self.__time_order = np.insert(self.__time_order, pos, new_rows)
+            self.__time_sorted = np.insert(self.__time_sorted, pos, new_times)
+            self.__indexed = self.size
+        return self.__time_order, self.__time_sorted
+    
+    def __utcOffset(self):
+        return int(self.tz.utcoffset(None).total_seconds())
+    
+    def localDays(self) -> np.ndarray:
+        # days since epoch of each game's start in the log's timezone
+        return (self.start_times + self.__utcOffset()) // 86400
+    
+    def getGamesBetween(self, start: datetime = None, end: datetime = None) -> np.ndarray:
+        """
+        rows of the games started in [start, end), in row order. either bound
+        can be omitted.
+        """
+        order, times = self.__timeIndex()
+        lo = np.searchsorted(times, int(start.timestamp()), side="left") if start is not None else 0
+        hi = np.searchsorted(times, int(end.timestamp()), side="left") if end is not None else len(times)
+        return np.sort(order[lo:hi])
+    
+    def getGamesSince(self, time: datetime) -> np.ndarray:
+        return self.getGamesBetween(start=time)
+    
+    def getGameFromDate(self, day: date) -> np.ndarray:
+        midnight = datetime(day.year, day.month, day.day, tzinfo=self.tz)
+        return self.getGamesBetween(midnight, midnight + timedelta(days=1))
+    
+    def getGameFromTime(self, time: datetime) -> np.ndarray:
+        return self.getGameFromDate(time.astimezone(self.tz).date())
+    
+    def getGameDays(self) -> list[date]:
+        _, times = self.__timeIndex()
+        return [date.fromordinal(EPOCH_ORDINAL + int(d)) for d in np.unique((times + self.__utcOffset()) // 86400)]
+    
+    def getLatestGame(self):
+        order, _ = self.__timeIndex()
+        return int(order[-1]) if len(order) else None
     
     def getModified(self):
         return self.modified
     
-    def exportToDict(self, games = None):
-        data_cols = ["开始时间","结束时间", "1位玩家","1位分数","1位终局点数","2位玩家","2位分数","2位终局点数","3位玩家","3位分数","3位终局点数","4位玩家","4位分数","4位终局点数","牌谱链接"]
-        data = {a: [] for a in data_cols}
-        games = games or self.game_list
-        #beijing_time = CNTZ()
+    def formatTimes(self, times: np.ndarray) -> list[str]:
+        # np.char.replace fails on empty arrays
+        if len(times) == 0:
+            return []
+        return np.char.replace(np.datetime_as_string((times + self.__utcOffset()).astype("datetime64[s]"), unit="s"), "T", " ").tolist()
+    
+    def exportToDict(self, games = None, players: PlayerPool = None, teams: Teams = None):
+        """
+        `games` is an array of row indices (all games if omitted), `players`
+        resolves account ids to current nicknames (falling back to the
+        nickname recorded with the game), `teams` adds the team columns
+        """
+        rows = np.arange(self.size) if games is None else np.asarray(games, dtype=np.int64)
+        # placement order within each game, ties keep seat order like a stable sort
+        order = np.argsort(-self.total_points[rows], axis=1, kind="stable")
+        account_ids = np.take_along_axis(self.account_ids[rows], order, axis=1)
+        part_points = np.take_along_axis(self.part_points[rows], order, axis=1)
+        total_points = np.take_along_axis(self.total_points[rows], order, axis=1) / 1000
 
-        for game in games:
-            game_data = sorted(game.players, key=lambda x:x["total_point"], reverse=True)
-            data["开始时间"].append(game.start_time.strftime("%Y-%m-%d %H:%M:%S"))
-            data["结束时间"].append(game.end_time.strftime("%Y-%m-%d %H:%M:%S"))
-            data["1位玩家"].append(game_data[0]["nickname"])
-            data["1位分数"].append(game_data[0]["part_point_1"])
-            data["1位终局点数"].append(game_data[0]["total_point"] / 1000)
-            data["2位玩家"].append(game_data[1]["nickname"])
-            data["2位分数"].append(game_data[1]["part_point_1"])
-            data["2位终局点数"].append(game_data[1]["total_point"] / 1000)
-            data["3位玩家"].append(game_data[2]["nickname"])
-            data["3位分数"].append(game_data[2]["part_point_1"])
-            data["3位终局点数"].append(game_data[2]["total_point"] / 1000)
-            data["4位玩家"].append(game_data[3]["nickname"])
-            data["4位分数"].append(game_data[3]["part_point_1"])
-            data["4位终局点数"].append(game_data[3]["total_point"] / 1000)
-            data["牌谱链接"].append("https://game.maj-soul.com/1/?paipu="+game.uuid)
+        unique_ids, inverse = np.unique(account_ids, return_inverse=True)
+        inverse = inverse.reshape(account_ids.shape)
+        if players is not None:
+            names = np.array([players.getNickname(int(a), self.nicknames.get(int(a), "")) for a in unique_ids] + [""], dtype=object)[inverse]
+        else:
+            names = np.array([self.nicknames.get(int(a), "") for a in unique_ids] + [""], dtype=object)[inverse]
+        if teams is not None:
+            team_names = np.array([teams.getPlayerTeam(int(a)) for a in unique_ids] + [""], dtype=object)[inverse]
+
+        data = {"开始时间": self.formatTimes(self.start_times[rows]), "结束时间": self.formatTimes(self.end_times[rows])}
+        for i in range(4):
+            data[f"{i+1}位玩家"] = names[:, i].tolist()
+            if teams is not None:
+                data[f"{i+1}位队伍"] = team_names[:, i].tolist()
+            data[f"{i+1}位分数"] = part_points[:, i].tolist()
+            data[f"{i+1}位终局点数"] = total_points[:, i].tolist()
+        data["牌谱链接"] = ["https://game.maj-soul.com/1/?paipu="+self.uuids[i] for i in rows]
         
         return data
              
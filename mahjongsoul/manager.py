@@ -1,12 +1,21 @@
+import base64
+import copy
 import hmac
 import hashlib
-import asyncio
+import itertools
 import requests
 import datetime
+import json
 import logging
+import os
+import threading
 import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import *
-from websockets.exceptions import ConnectionClosed, ConnectionClosedError, InvalidStatusCode
+
+from .codec import loads
+from .retry import AUTH, CONNECT, DECODE, NETWORK, RATE_LIMIT, SERVER, HostGuard, RetryPolicy, classify, retry_after
 
 # MS_MANAGER_WSS_ENDPOINT: `__MJ_DHS_WS__` from https://www.maj-soul.com/dhs/js/config.js
 # MS_MANAGER_WSS_ENDPOINT = "wss://common-v2.maj-soul.com/contest_ws_gateway"
@@ -15,11 +24,51 @@ SOUTH = 1
 WEST = 2
 NORTH = 3
 
+# failures that count against a host's circuit breaker, a refused token or request says nothing about the host's health
+HOST_FAILURES = (CONNECT, NETWORK, SERVER, RATE_LIMIT, DECODE)
+
+class ContestAPIError(Exception):
+    """
+    a contest API call that failed for good, or that was answered with an
+    error instead of data
+    """
+
+def response_data(res):
+    if res is None:
+        raise ContestAPIError("contest API call failed, see the log for the reason")
+    if "data" not in res:
+        raise ContestAPIError(f"contest API answered with an error: {res.get('error', res)}")
+    return res["data"]
+
+def running_season_id(seasons: List[Dict]) -> int:
+    running = [d["season_id"] for d in seasons if d["state"] == 2]
+    if not running:
+        raise ContestAPIError("the contest has no running season")
+    return int(running[0])
+
 class TournamentAPI:
-    def __init__(self, log_messages=False, logger_name="Contest Manager"):
+    def __init__(self, log_messages=False, logger_name="Contest Manager", pool_size: int = 10, timeout: Optional[float] = 30, endpoint: Optional[str] = None,
+                 retry_policy: Optional[RetryPolicy] = None, guard: Optional[HostGuard] = None):
+        """
+        `retry_policy` decides which failed calls are sent again, `guard`
+        rate limits the calls to every host and stops calling a host that
+        keeps failing. both are shared with the async clients of this object
+        """
         self.logger = logging.getLogger(logger_name)
         self.log_messages = log_messages
-        self.endpoint = "https://contest-gate-202411.maj-soul.com/api/"
+        self.endpoint = endpoint or "https://contest-gate-202411.maj-soul.com/api/"
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.guard = guard or HostGuard()
+        # set to a `replay.ApiRecorder` to capture every decoded response
+        self.recorder = None
+        # set to a `metrics.Metrics` to count the calls made through this object (and the async clients sharing it)
+        self.metrics = None
+        # one keep-alive pool per host, reused by every call made through this object
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         self.headers = {
             "Referer": "https://www.maj-soul.com/",
             "Accept": "application/json, */*",
@@ -28,93 +77,358 @@ class TournamentAPI:
             "Connection": "keep-alive",
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:109.0) Gecko/20100101 Firefox/123.0",
         }
+        self.login_lock = threading.Lock()
 
-    def get(self, method: str, endpoint: str = "", second_try: bool = False, **params):
-        try:
-            return requests.get((endpoint or self.endpoint) + method, params=params, headers=self.headers).json()
-        except Exception as e:
-            if not second_try:
-                self.logger.info("Attempting to log in again in order to resend the request...")
-                self.login()
-                return self.get(method=method, endpoint=endpoint, second_try=True, **params)
+    def request(self, http_method: str, method: str, endpoint: str = "", second_try: bool = False, params: Dict = {}, data: Optional[Dict] = None):
+        """
+        returns the decoded json response, or None once the call has failed
+        for good. failures are sent again as `retry_policy` allows, an auth
+        failure logs in again (once, not with `second_try`) and resends
+        """
+        url = (endpoint or self.endpoint) + method
+        host = self.guard.host(url)
+        attempt = 0
+        while True:
+            attempt += 1
+            if not self.guard.breaker(host).allow():
+                self.observe_call(method, "circuit_open", time.perf_counter())
+                self.logger.info(f"{method} not sent, too many failures on {host}")
+                return None
+            time.sleep(self.guard.bucket(host).reserve())
+            authorization = self.headers.get("Authorization")
+            kind, response, wait = self.send(http_method, method, url, params, data)
+            self.guard.breaker(host).record(kind not in HOST_FAILURES)
+            if kind is None:
+                if self.recorder is not None:
+                    self.recorder.record(http_method, method, params, data, response)
+                return response
+            action, delay = self.next_step(http_method, method, kind, attempt, second_try, wait)
+            if action == "fail":
+                return None
+            if action == "relogin":
+                second_try = True
+                self.relogin(authorization)
             else:
-                self.logger.info("Relog failed, not trying again")
-    def post(self, method: str, params: Dict = {}, endpoint: str = "", second_try: bool = False, **data):
+                time.sleep(delay)
+    def send(self, http_method: str, method: str, url: str, params: Dict, data: Optional[Dict]) -> Tuple[Optional[str], Any, Optional[float]]:
+        """
+        one try: (kind of failure or None, decoded response, retry-after seconds)
+        """
+        started = time.perf_counter()
         try:
-            return requests.post((endpoint or self.endpoint) + method, params=params, headers=self.headers, json=data).json()
-        except Exception as e:
-            if not second_try:
-                self.logger.info("Attempting to log in again in order to resend the request...")
-                self.login()
-                return self.post(method=method, params=params, endpoint=endpoint, second_try=True, **data)
-            else:
+            res = self.session.request(http_method, url, params=params, headers=self.headers, json=data, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.observe_call(method, "error", started, data)
+            self.logger.info(f"{method} failed: {e!r}")
+            return (CONNECT if isinstance(e, requests.ConnectTimeout) else NETWORK), None, None
+        self.observe_call(method, res.status_code, started, data, len(res.content))
+        if (kind := classify(res.status_code)) is not None:
+            return kind, None, retry_after(res.headers.get("Retry-After"))
+        try:
+            return None, loads(res.content), None
+        except ValueError as e:
+            self.logger.info(f"{method} returned an invalid response: {e!r}")
+            return DECODE, None, None
+    def next_step(self, http_method: str, method: str, kind: str, attempt: int, second_try: bool, wait: Optional[float]) -> Tuple[str, float]:
+        """
+        what to do after a failed try: ("relogin", 0), ("retry", delay) or ("fail", 0)
+        """
+        if kind == AUTH:
+            if second_try:
                 self.logger.info("Relog failed, not trying again")
+                return "fail", 0
+            self.logger.info("Attempting to log in again in order to resend the request...")
+            if self.metrics is not None:
+                self.metrics.observe_retry(method, kind)
+            return "relogin", 0
+        if not self.retry_policy.should_retry(http_method, kind, attempt):
+            self.logger.info(f"{method} failed ({kind}) after {attempt} attempt(s), not trying again")
+            return "fail", 0
+        delay = self.retry_policy.delay(attempt, wait)
+        if self.metrics is not None:
+            self.metrics.observe_retry(method, kind)
+        self.logger.info(f"{method} failed ({kind}), trying again in {delay:.1f}s")
+        return "retry", delay
+    def observe_call(self, method: str, status, started: float, data: Optional[Dict] = None, received: int = 0):
+        if self.metrics is not None:
+            self.metrics.observe_call(method, status, time.perf_counter() - started, len(json.dumps(data).encode()) if data is not None else 0, received)
+    def get(self, method: str, endpoint: str = "", second_try: bool = False, **params):
+        return self.request("GET", method, endpoint, second_try, params=params)
+    def post(self, method: str, params: Dict = {}, endpoint: str = "", second_try: bool = False, **data):
+        return self.request("POST", method, endpoint, second_try, params=params, data=data)
+    def relogin(self, stale_authorization: Optional[str]):
+        """
+        single-flight re-login: of the callers that saw `stale_authorization`
+        fail at the same time, only the first one logs in, the others wait
+        for it and reuse its token
+        """
+        with self.login_lock:
+            if self.headers.get("Authorization") != stale_authorization:
+                return
+            self.login()
     def login(self):
         pass
+    def close(self):
+        self.session.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        self.close()
 
 class TournamentLogin(TournamentAPI):
-    def __init__(self, mjs_email: str, mjs_pw: str, log_messages=False, logger_name="Contest Manager"):
-        super().__init__(log_messages, logger_name)
+    """
+    logged in `TournamentAPI`. With `token_file`, the login token and its
+    expiry are kept in that file and reused by the next run instead of
+    logging in again. The token is renewed in a background thread
+    `refresh_margin` seconds before it expires, but not before half of its
+    lifetime has passed and at most once every `min_refresh_interval`
+    seconds, so short lived tokens don't log in again in a tight loop.
+    Tokens that don't carry an expiry (jwt "exp") are assumed to last
+    `token_ttl` seconds.
+    """
+    def __init__(self, mjs_email: str, mjs_pw: str, log_messages=False, logger_name="Contest Manager", pool_size: int = 10, timeout: Optional[float] = 30,
+                 token_file: Optional[str] = None, token_ttl: float = 12 * 3600, refresh_margin: float = 600, endpoint: Optional[str] = None,
+                 retry_policy: Optional[RetryPolicy] = None, guard: Optional[HostGuard] = None, min_refresh_interval: float = 60):
+        super().__init__(log_messages, logger_name, pool_size, timeout, endpoint, retry_policy, guard)
         self.mjs_email = mjs_email
         self.mjs_passwd = hmac.new(b"lailai", mjs_pw.encode(), hashlib.sha256).hexdigest()
-        self.login()
+        self.token_file = token_file
+        self.token_ttl = token_ttl
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self.login_token = None
+        self.token_expires = 0.0
+        self.token_obtained = 0.0
+        if not self.load_token():
+            self.login()
+        self.stop_refresh = threading.Event()
+        self.refresher = threading.Thread(target=self.refresh_loop, name=f"{logger_name} token refresh", daemon=True)
+        self.refresher.start()
     def login(self):
         self.login_token = self.get_new_login_token()
+        self.token_expires = self.get_token_expiry(self.login_token)
+        self.token_obtained = time.time()
         self.headers["Authorization"] = "Majsoul " + self.login_token
+        self.save_token()
     def get_login_token(self):
         return self.login_token
     def get_new_login_token(self):
+        login = None
         try:
             #token = login["accessToken"]
-            login = self.post("login", account=self.mjs_email, password=self.mjs_passwd, type=0)
+            # second_try: an auth failure here must not log in again
+            login = self.post("login", second_try=True, account=self.mjs_email, password=self.mjs_passwd, type=0)
             login_token = login["data"]["token"]
         except Exception as e:
             print("Error: " + str(e))
             print("login result: " + str(login))
+            raise
         if self.log_messages:
             self.logger.info("Login token: " + login_token)
         return login_token
+    def get_token_expiry(self, token: str) -> float:
+        try:
+            payload = token.split(".")[1]
+            return float(json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))["exp"])
+        except Exception:
+            return time.time() + self.token_ttl
+    def load_token(self) -> bool:
+        """
+        use the token saved in `token_file` if it belongs to this account and
+        is not about to expire
+        """
+        if not self.token_file or not os.path.exists(self.token_file):
+            return False
+        try:
+            with open(self.token_file, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved["email"] != self.mjs_email or saved["expires"] - self.refresh_margin <= time.time():
+                return False
+            self.login_token, self.token_expires = saved["token"], float(saved["expires"])
+            self.token_obtained = time.time()
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        self.headers["Authorization"] = "Majsoul " + self.login_token
+        return True
+    def save_token(self):
+        if not self.token_file:
+            return
+        # the token is a credential, keep the file private
+        fd = os.open(self.token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump({"email": self.mjs_email, "token": self.login_token, "expires": self.token_expires}, f)
+    def refresh_delay(self) -> float:
+        margin = min(self.refresh_margin, max(0.0, self.token_expires - self.token_obtained) / 2)
+        refresh_at = max(self.token_expires - margin, self.token_obtained + self.min_refresh_interval)
+        return max(0.0, refresh_at - time.time())
+    def refresh_loop(self):
+        while not self.stop_refresh.wait(self.refresh_delay()):
+            try:
+                self.relogin(self.headers.get("Authorization"))
+            except Exception as e:
+                self.logger.info(f"Token refresh failed ({e!r}), retrying in a minute")
+                if self.stop_refresh.wait(60):
+                    return
+    def close(self):
+        self.stop_refresh.set()
+        super().close()
+
+class ResponseCache:
+    """
+    responses of idempotent GETs kept for a per-method time to live (seconds,
+    methods without a ttl are never cached), keyed by method, endpoint and
+    parameters. `hits` and `misses` count the lookups per method.
+
+    entries are copied in and out, so callers are free to modify what they get
+    """
+    def __init__(self, ttls: Dict[str, float]):
+        self.ttls = ttls
+        self.entries: Dict[Tuple, Tuple[float, Any]] = {}
+        self.hits = Counter()
+        self.misses = Counter()
+        self.lock = threading.Lock()
+
+    def get(self, method: str, key: Hashable, fetch: Callable[[], Any]):
+        ttl = self.ttls.get(method, 0)
+        with self.lock:
+            if ttl > 0 and (entry := self.entries.get((method, key))) is not None and time.monotonic() < entry[0]:
+                self.hits[method] += 1
+                return copy.deepcopy(entry[1])
+            self.misses[method] += 1
+        res = fetch()
+        # failed calls come back as None and are retried next time
+        if ttl > 0 and res is not None:
+            with self.lock:
+                self.entries[(method, key)] = (time.monotonic() + ttl, copy.deepcopy(res))
+        return res
+
+    def invalidate(self, *methods: str):
+        """
+        drop the entries of `methods`, or every entry when none is given
+        """
+        with self.lock:
+            if not methods:
+                self.entries.clear()
+                return
+            for key in [key for key in self.entries if key[0] in methods]:
+                del self.entries[key]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {method: {"hits": self.hits[method], "misses": self.misses[method]} for method in self.hits.keys() | self.misses.keys()}
 
 class ContestManager:
-    def __init__(self, contest_unique_id: int, api: TournamentLogin, game_type: str):
+    # seconds a GET response stays valid in the cache, calls not listed here always hit the API
+    CACHE_TTL = {
+        "contest/fetch_contest_season_list": 300,
+        "contest/fetch_contest_detail": 60,
+        "contest/fetch_contest_team_list": 60,
+        "contest/contest_season_player_list": 30,
+        "contest/fetch_season_player_data": 30,
+        "contest/contest_running_game_list": 2,
+        "fetch_contest_game_plan_list": 5,
+    }
+    def __init__(self, contest_unique_id: int, api: TournamentLogin, game_type: str, cache: Optional[ResponseCache] = None, season_id: Optional[int] = None):
+        """
+        `cache` can be shared between managers (e.g. one per bot command) to
+        skip the season lookup and the other cached GETs of the previous ones.
+        `season_id` picks a season (a past one, say) instead of the running one
+        """
         self.contest_unique_id = contest_unique_id
         self.api = api
         self.game_type = game_type
         self.logger = logging.getLogger(game_type)
-        self.season_id = 1
-        self.get_current_season()
+        self.cache = cache if cache is not None else ResponseCache(self.CACHE_TTL)
+        self.season_id = season_id or 1
+        if season_id is None:
+            self.get_current_season()
+    def cached_get(self, method: str, endpoint: str = "", **params):
+        return self.cache.get(method, (endpoint, tuple(sorted(params.items()))), lambda: self.api.get(method=method, endpoint=endpoint, **params))
+    def get_seasons(self) -> List[Dict]:
+        return response_data(self.cached_get(method=f"contest/fetch_contest_season_list", unique_id=str(self.contest_unique_id)))
     def get_current_season(self):
-        self.season_id = int([d["season_id"] for d in self.api.get(method=f"contest/fetch_contest_season_list", unique_id=str(self.contest_unique_id))["data"] if d["state"] == 2][0])
+        self.season_id = running_season_id(self.get_seasons())
         return self.season_id
     def get_all_players_stats_card(self, offset=0, limit=20):
-        return self.api.get(method="contest/contest_season_player_list", unique_id=self.contest_unique_id, season_id=self.season_id, search=None, state=2, offset=offset, limit=limit)["data"]
+        return response_data(self.cached_get(method="contest/contest_season_player_list", unique_id=self.contest_unique_id, season_id=self.season_id, search=None, state=2, offset=offset, limit=limit))
     def get_player_stats_card(self, account_id):
-        return self.api.get(method="contest/fetch_season_player_data", unique_id=self.contest_unique_id, season_id=self.season_id, account_id=account_id)["data"]
+        return response_data(self.cached_get(method="contest/fetch_season_player_data", unique_id=self.contest_unique_id, season_id=self.season_id, account_id=account_id))
     def get_teams(self, offset=0, limit=300):
-        return self.api.get(method="contest/fetch_contest_team_list", unique_id=self.contest_unique_id, season_id=self.season_id, offset=offset, limit=limit)["data"]
+        return response_data(self.cached_get(method="contest/fetch_contest_team_list", unique_id=self.contest_unique_id, season_id=self.season_id, offset=offset, limit=limit))
     def get_team_members(self, team_id, offset=0, limit=10):
-        return self.api.post(method="contest/fetch_contest_team_member_list", unique_id=str(self.contest_unique_id), season_id=self.season_id, team_id=team_id, offset=offset, limit=limit)["data"]
+        return response_data(self.api.post(method="contest/fetch_contest_team_member_list", unique_id=str(self.contest_unique_id), season_id=self.season_id, team_id=team_id, offset=offset, limit=limit))
     def get_logs(self, offset=0, limit=10):
-        return self.api.get(method="contest/fetch_contest_game_records", unique_id=self.contest_unique_id, season_id=self.season_id,offset=offset, limit=limit)["data"]
+        return response_data(self.api.get(method="contest/fetch_contest_game_records", unique_id=self.contest_unique_id, season_id=self.season_id,offset=offset, limit=limit))
+    def iter_logs(self, page_size=100, prefetch=0, known_uuids: Optional[Container[str]] = None) -> Iterator[Dict]:
+        """
+        yield every game record of the season, newest first, fetching
+        `page_size` records per request. With `prefetch` > 0, up to that many
+        of the following pages are requested in the background while the
+        current one is being consumed. Paging stops at the first record whose
+        uuid is in `known_uuids`, since everything older has been seen already.
+        A record that shows up on two pages (see `iter_log_pages`) is yielded
+        once.
+        """
+        seen = set()
+        for page in self.iter_log_pages(page_size=page_size, prefetch=prefetch):
+            for record in page:
+                if known_uuids is not None and record["uuid"] in known_uuids:
+                    return
+                if record["uuid"] not in seen:
+                    seen.add(record["uuid"])
+                    yield record
+    def iter_log_pages(self, page_size=100, prefetch=0) -> Iterator[List[Dict]]:
+        """
+        pages of the season's game records, newest first, up to the first page
+        that comes back short. The `total` of the first page is not trusted:
+        a game that ends while the season is being paged shifts every record
+        one down, the oldest ones would fall past it. Such a shift repeats the
+        last record of a page at the top of the next one instead
+        """
+        offsets = itertools.count(0, page_size)
+        if prefetch <= 0:
+            for offset in offsets:
+                records = self.get_logs(offset=offset, limit=page_size)["record_list"]
+                if records:
+                    yield records
+                if len(records) < page_size:
+                    return
+        with ThreadPoolExecutor(max_workers=prefetch) as pool:
+            pending = deque()
+            try:
+                while True:
+                    while len(pending) <= prefetch:
+                        pending.append(pool.submit(self.get_logs, offset=next(offsets), limit=page_size))
+                    records = pending.popleft().result()["record_list"]
+                    if records:
+                        yield records
+                    if len(records) < page_size:
+                        return
+            finally:
+                for future in pending:
+                    future.cancel()
     def pause_match_impl(self, uuid: str, resume: int):
-        return self.api.post(method="contest/pause_contest_running_game", unique_id=str(self.contest_unique_id), game_uuid=uuid, resume=resume)
+        res = self.api.post(method="contest/pause_contest_running_game", unique_id=str(self.contest_unique_id), game_uuid=uuid, resume=resume)
+        self.cache.invalidate("contest/contest_running_game_list")
+        return res
     def pause_match(self, uuid: str):
         return self.pause_match_impl(uuid=uuid, resume=1)
     def resume_match(self, uuid: str):
         return self.pause_match_impl(uuid=uuid, resume=2)
     def terminate_match(self, uuid: str):
-        return self.api.post(method="contest/terminate_contest_running_game", unique_id=str(self.contest_unique_id), uuid=uuid)
+        res = self.api.post(method="contest/terminate_contest_running_game", unique_id=str(self.contest_unique_id), uuid=uuid)
+        self.cache.invalidate("contest/contest_running_game_list")
+        return res
     def poll_participants(self) -> List[Dict]: # ready players in lobby
         # call returns {"data":[{"account_id":118325554,"nickname":"Kalanchloe"}]}
-        return self.api.get(method="contest/ready_player_list", unique_id=self.contest_unique_id, season_id=self.season_id)["data"]
+        return response_data(self.api.get(method="contest/ready_player_list", unique_id=self.contest_unique_id, season_id=self.season_id))
     def poll_match_list(self) -> List[Dict]:
         # call returns {"data":[{"game_uuid":"240725-550d2f43-904b-4412-bd31-514668e4d4d5","players":[{"account_id":118325554,"nickname":"Kalanchloe"},{"account_id":0},{"account_id":0},{"account_id":0}],"start_time":1721920249,"tag":""}]}
-        return self.api.get(method="contest/contest_running_game_list", unique_id=self.contest_unique_id, season_id=self.season_id)["data"]
+        return response_data(self.api.get(method="contest/contest_running_game_list", unique_id=self.contest_unique_id, season_id=self.season_id))
     def poll_match(self, uuid: str) -> Dict:
         # call returns {"uuid":"240725-550d2f43-904b-4412-bd31-514668e4d4d5","chang":0,"ju":0,"ben":0,"is_end":0,"update_time":1721920266,"scores":[1000,1000,1000,1000]}
         return self.api.get(method=f"game/realtime/{uuid}/progress/latest", endpoint="https://contesten.mahjongsoul.com:7443/api/")
     def fetch_rules(self):
-        return self.api.get(method="contest/fetch_contest_detail", endpoint="https://mjusgs.mahjongsoul.com:8200/api/", unique_id=str(self.contest_unique_id))["data"]
+        return response_data(self.cached_get(method="contest/fetch_contest_detail", endpoint="https://mjusgs.mahjongsoul.com:8200/api/", unique_id=str(self.contest_unique_id)))
     def change_season_rules(self, season_id: int, auto_match: Optional[bool] = True):
         default_rules = self.fetch_rules()["season_list"][0]
         data = {
@@ -130,7 +444,9 @@ class ContestManager:
                 "signup_type": default_rules["signup_type"]
             }
         }
-        return self.api.post(method=f"contest/update_contest_season", endpoint="https://mjusgs.mahjongsoul.com:8200/api/", **data)
+        res = self.api.post(method=f"contest/update_contest_season", endpoint="https://mjusgs.mahjongsoul.com:8200/api/", **data)
+        self.cache.invalidate("contest/fetch_contest_detail", "contest/fetch_contest_season_list")
+        return res
     def change_contest_detail_rules(self, detail_rule):
         # see Utilities/rules.py and Utilities/cog.py for how the argument is constructed
         default_rules = self.fetch_rules()
@@ -141,7 +457,9 @@ class ContestManager:
             "setting": default_rules["contest_setting"],
             "game_rule_setting": game_mode
         }
-        return self.api.post(method=f"contest/update_contest_base", endpoint="https://mjusgs.mahjongsoul.com:8200/api/", **data)
+        res = self.api.post(method=f"contest/update_contest_base", endpoint="https://mjusgs.mahjongsoul.com:8200/api/", **data)
+        self.cache.invalidate("contest/fetch_contest_detail")
+        return res
     def change_contest_name(self, name):
         default_rules = self.fetch_rules()
         data = {
@@ -153,7 +471,9 @@ class ContestManager:
                 "available_zones": default_rules["available_zones"]
             }
         }
-        return self.api.post(method=f"contest/update_contest_base", endpoint="https://mjusgs.mahjongsoul.com:8200/api/", **data)
+        res = self.api.post(method=f"contest/update_contest_base", endpoint="https://mjusgs.mahjongsoul.com:8200/api/", **data)
+        self.cache.invalidate("contest/fetch_contest_detail")
+        return res
     def change_contest_desc(self, desc):
         data = {
             "unique_id": self.contest_unique_id,
@@ -166,14 +486,16 @@ class ContestManager:
                 {"lang": "kr", "content": ""}
             ]
         }
-        return self.api.post(method=f"contest/update_contest_external_notice", endpoint="https://mjusgs.mahjongsoul.com:8200/api/", **data)
+        res = self.api.post(method=f"contest/update_contest_external_notice", endpoint="https://mjusgs.mahjongsoul.com:8200/api/", **data)
+        self.cache.invalidate("contest/fetch_contest_detail")
+        return res
 
     def get_ongoing_game_uuid(self, nickname):
         """
         return the self.mjs_uid for an ongoing game the specified player is in
         """
-        res = self.api.get(method="contest/contest_running_game_list", unique_id=self.contest_unique_id, season_id=self.season_id)
-        for game in res["data"]:
+        res = self.cached_get(method="contest/contest_running_game_list", unique_id=self.contest_unique_id, season_id=self.season_id)
+        for game in response_data(res):
             for player in game["players"]:
                 if "nickname" in player and player["nickname"] == nickname:
                     return game["game_uuid"]
@@ -222,7 +544,9 @@ class ContestManager:
             "ai_level": ai_level,
             "remark": tag
         }
-        return self.api.post(method="contest/create_game_plan", **data)
+        res = self.api.post(method="contest/create_game_plan", **data)
+        self.cache.invalidate("fetch_contest_game_plan_list", "contest/contest_running_game_list")
+        return res
     
     def get_planned_games(self):
         """
@@ -245,6 +569,61 @@ class ContestManager:
             ]
         }
         """
-        return self.api.get(method="fetch_contest_game_plan_list", unique_id=self.contest_unique_id, season_id=self.season_id)["data"]
+        return response_data(self.cached_get(method="fetch_contest_game_plan_list", unique_id=self.contest_unique_id, season_id=self.season_id))
+
+    def schedule_games(self, tables: List[Dict], max_concurrency: int = 8) -> List[Dict]:
+        """
+        plan a whole match day. every entry of `tables` holds the keyword
+        arguments of `start_game` for one table (the seats' account ids can be
+        picked from `Team.players`). the plans are submitted at most
+        `max_concurrency` at a time, then checked against a single fetch of
+        `get_planned_games`.
+
+        returns one report per table, in the order of `tables`:
+        {"table": the entry, "ok": bool, "uuid": uuid of the plan or None, "error": str or None}
+        """
+        # pin the start time, the plan is recognized by it in the planned list
+        now = int(time.time())
+        tables = [{**table, "start_time": table["start_time"] if table.get("start_time") is not None else now} for table in tables]
+        def submit(table):
+            # one bad table (a mistyped key, a failed relogin...) must not cost the others their report
+            try:
+                key = self.plan_key(table.get("account_ids", [0, 0, 0, 0]), table["start_time"], table.get("tag", ""))
+                return self.start_game(**table), key, None
+            except Exception as e:
+                self.logger.info(f"Could not plan {table}: {e!r}")
+                return None, None, repr(e)
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            responses = list(pool.map(submit, tables))
+        try:
+            planned = self.get_planned_games()
+        except Exception as e:
+            self.logger.info(f"Could not fetch the planned games to check the schedule: {e!r}")
+            planned = None
+        uuids = defaultdict(deque)
+        for plan in planned or []:
+            uuids[self.plan_key([a["account_id"] for a in plan["accounts"]], plan["game_start_time"], plan.get("remark") or "")].append(plan["uuid"])
+        reports = []
+        for table, (res, key, error) in zip(tables, responses):
+            report = {"table": table, "ok": False, "uuid": None, "error": None}
+            if error is not None:
+                report["error"] = error
+            elif res is None:
+                report["error"] = "request failed"
+            elif res.get("error"):
+                report["error"] = str(res["error"])
+            elif planned is None:
+                report["error"] = "submitted, but the planned game list could not be fetched"
+            elif not uuids[key]:
+                report["error"] = "submitted, but missing from the planned game list"
+            else:
+                report["ok"], report["uuid"] = True, uuids[key].popleft()
+            reports.append(report)
+        return reports
+
+    @staticmethod
+    def plan_key(account_ids: List[int], start_time: int, tag: str) -> Tuple:
+        # seats may be shuffled, so the players are compared as a multiset
+        return tuple(sorted(account_ids)), int(start_time), tag
 
-    #remove_contest_plan_game(json({"season_id", "unique_id", "uuid"}))
\ No newline at end of file
+    #remove_contest_plan_game(json({"season_id", "unique_id", "uuid"}))
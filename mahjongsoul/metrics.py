@@ -0,0 +1,153 @@
+import bisect
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+
+from collections import Counter, defaultdict
+from typing import *
+
+# realtime endpoints carry the game uuid, which would make one series per game
+UUID_SEGMENT = re.compile(r"/\d{6}-[0-9a-f]{8}-[0-9a-f-]+")
+
+def endpoint_label(method: str) -> str:
+    return UUID_SEGMENT.sub("/{uuid}", "/" + method)[1:]
+
+class Metrics:
+    """
+    counters of the contest API calls and durations of the pipeline stages.
+
+    a `TournamentAPI` with `metrics` set reports every call to it (count by
+    status, latency histogram, bytes sent and received, retries), response
+    caches added with `watch_cache` contribute their hits and misses, and
+    `stage(name)` times a block of the pipeline.
+
+    `to_json` gives a snapshot as one json line, `to_prometheus` as
+    prometheus text exposition
+    """
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Counter = Counter()
+        self.retries: Counter = Counter()
+        self.bytes_sent: Counter = Counter()
+        self.bytes_received: Counter = Counter()
+        # endpoint -> call count per bucket (the last one is +Inf), not cumulative
+        self.latency_buckets: Dict[str, List[int]] = defaultdict(lambda: [0] * (len(self.LATENCY_BUCKETS) + 1))
+        self.latency_sum: Counter = Counter()
+        # stage -> [last, total seconds, count]
+        self.stages: Dict[str, List[float]] = {}
+        self.caches = []
+
+    def observe_call(self, method: str, status, seconds: float, sent: int = 0, received: int = 0):
+        """
+        `status` is the http status, or a short reason ("error", "invalid")
+        when there is no usable response
+        """
+        endpoint = endpoint_label(method)
+        with self.lock:
+            self.calls[(endpoint, str(status))] += 1
+            self.latency_buckets[endpoint][bisect.bisect_left(self.LATENCY_BUCKETS, seconds)] += 1
+            self.latency_sum[endpoint] += seconds
+            self.bytes_sent[endpoint] += sent
+            self.bytes_received[endpoint] += received
+
+    def observe_retry(self, method: str, reason: str):
+        with self.lock:
+            self.retries[(endpoint_label(method), reason)] += 1
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                last, total, count = self.stages.get(name, (0.0, 0.0, 0))
+                self.stages[name] = [elapsed, total + elapsed, count + 1]
+
+    def watch_cache(self, cache):
+        """
+        report the hits and misses of a `manager.ResponseCache`
+        """
+        self.caches.append(cache)
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            api = {endpoint: {"calls": {}, "retries": {}} for endpoint, _ in self.calls.keys() | self.retries.keys()}
+            for (endpoint, status), n in self.calls.items():
+                api[endpoint]["calls"][status] = n
+            for (endpoint, reason), n in self.retries.items():
+                api[endpoint]["retries"][reason] = n
+            for endpoint, entry in api.items():
+                buckets = self.latency_buckets[endpoint]
+                entry["latency"] = {
+                    "buckets": dict(zip([str(b) for b in self.LATENCY_BUCKETS] + ["+Inf"], buckets)),
+                    "sum": self.latency_sum[endpoint],
+                    "count": sum(buckets),
+                }
+                entry["bytes_sent"] = self.bytes_sent[endpoint]
+                entry["bytes_received"] = self.bytes_received[endpoint]
+            stages = {name: {"seconds": last, "total_seconds": total, "count": count} for name, (last, total, count) in self.stages.items()}
+        cache = {}
+        for c in self.caches:
+            for method, counts in c.stats().items():
+                entry = cache.setdefault(method, {"hits": 0, "misses": 0})
+                entry["hits"] += counts["hits"]
+                entry["misses"] += counts["misses"]
+        return {"time": time.time(), "api": api, "cache": cache, "stages": stages}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False)
+
+    def to_prometheus(self, prefix: str = "mjs") -> str:
+        snapshot = self.snapshot()
+        def labels(**kv):
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in kv.items()) + "}"
+        lines = []
+        def metric(name, kind, samples):
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            lines.extend(f"{prefix}_{sample} {value}" for sample, value in samples)
+
+        api = snapshot["api"]
+        metric("api_calls_total", "counter", [(f"api_calls_total{labels(endpoint=e, status=s)}", n) for e in api for s, n in api[e]["calls"].items()])
+        histogram = []
+        for e, entry in api.items():
+            cumulative = 0
+            for le, n in entry["latency"]["buckets"].items():
+                cumulative += n
+                histogram.append((f"api_latency_seconds_bucket{labels(endpoint=e, le=le)}", cumulative))
+            histogram.append((f"api_latency_seconds_sum{labels(endpoint=e)}", entry["latency"]["sum"]))
+            histogram.append((f"api_latency_seconds_count{labels(endpoint=e)}", entry["latency"]["count"]))
+        metric("api_latency_seconds", "histogram", histogram)
+        metric("api_bytes_sent_total", "counter", [(f"api_bytes_sent_total{labels(endpoint=e)}", api[e]["bytes_sent"]) for e in api])
+        metric("api_bytes_received_total", "counter", [(f"api_bytes_received_total{labels(endpoint=e)}", api[e]["bytes_received"]) for e in api])
+        metric("api_retries_total", "counter", [(f"api_retries_total{labels(endpoint=e, reason=r)}", n) for e in api for r, n in api[e]["retries"].items()])
+        cache = snapshot["cache"]
+        metric("cache_hits_total", "counter", [(f"cache_hits_total{labels(endpoint=m)}", c["hits"]) for m, c in cache.items()])
+        metric("cache_misses_total", "counter", [(f"cache_misses_total{labels(endpoint=m)}", c["misses"]) for m, c in cache.items()])
+        stages = snapshot["stages"]
+        metric("stage_seconds", "gauge", [(f"stage_seconds{labels(stage=s)}", v["seconds"]) for s, v in stages.items()])
+        metric("stage_seconds_total", "counter", [(f"stage_seconds_total{labels(stage=s)}", v["total_seconds"]) for s, v in stages.items()])
+        metric("stage_runs_total", "counter", [(f"stage_runs_total{labels(stage=s)}", v["count"]) for s, v in stages.items()])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, fmt: str = "jsonl"):
+        """
+        append a json line to `path`, or replace it with the prometheus text
+        (for node_exporter's textfile collector) when `fmt` is "prometheus"
+        """
+        if fmt == "prometheus":
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+            # atomic, so a collector never reads half a file
+            os.replace(path + ".tmp", path)
+        elif fmt == "jsonl":
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(self.to_json() + "\n")
+        else:
+            raise ValueError(f"unknown metrics format {fmt!r}, expected jsonl or prometheus")
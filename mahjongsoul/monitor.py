@@ -0,0 +1,168 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import *
+
+from .helper import Games
+from .asyncmanager import AsyncContestManager
+from .retry import RetryPolicy, TokenBucket
+from .store import GameStore
+
+class ContestMonitor:
+    """
+    long-running poller of a contest's live tables.
+
+    every `poll_interval` seconds the running game list is fetched, then the
+    progress of every live table is polled concurrently. changes are passed
+    to `on_event` (a plain function or a coroutine function) as dicts with a
+    "type" of "game_started", "hand_advanced", "score_changed" or
+    "game_ended". once a game has ended only its own record is fetched and
+    added to `games`, the "game_ended" event carries the new row index of
+    the game in `games`. `store`, if given, is kept gapless (see
+    `store_page`).
+
+    `rate_limits` maps "match_list", "progress" and "logs" to the calls per
+    second allowed on that endpoint. an endpoint (or a single table's
+    progress) that fails is left alone for a while, the wait grows with
+    every consecutive failure as given by `backoff`.
+    """
+    DEFAULT_RATE_LIMITS = {"match_list": 1, "progress": 5, "logs": 1}
+
+    def __init__(self, manager: AsyncContestManager, games: Games, on_event: Callable[[Dict], Any] = None,
+                 store: Optional[GameStore] = None, poll_interval: float = 10, rate_limits: Optional[Dict[str, float]] = None,
+                 logs_page_size: int = 20, record_timeout: float = 600, backoff: Optional[RetryPolicy] = None):
+        self.manager = manager
+        self.games = games
+        self.on_event = on_event
+        self.store = store
+        self.poll_interval = poll_interval
+        self.logs_page_size = logs_page_size
+        self.record_timeout = record_timeout
+        rate_limits = {**self.DEFAULT_RATE_LIMITS, **(rate_limits or {})}
+        self.limiters = {name: TokenBucket(rate, burst=max(1, int(rate))) for name, rate in rate_limits.items()}
+        self.backoff = backoff or RetryPolicy(base=1, cap=60)
+        # endpoint or table uuid -> consecutive failures, and the time it may be called again
+        self.failures: Dict[str, int] = {}
+        self.not_before: Dict[str, float] = {}
+        self.logger = logging.getLogger(f"{manager.game_type} monitor")
+        # uuid -> player list of the tables currently running
+        self.live: Dict[str, List[Dict]] = {}
+        # uuid -> last progress seen
+        self.progress: Dict[str, Dict] = {}
+        # uuid -> time the game was seen ending, for games whose record is not in `games` yet
+        self.finished: Dict[str, float] = {}
+        self.stored: Set[str] = store.known_uuids() if store is not None else set()
+
+    async def emit(self, event: Dict):
+        if self.on_event is None:
+            return
+        result = self.on_event(event)
+        if inspect.isawaitable(result):
+            await result
+
+    async def call(self, endpoint: str, func, *args, backoff_key: Optional[str] = None, **kwargs):
+        """
+        rate limited call to `endpoint`, returns None instead of raising and
+        backs off (per table when `backoff_key` is a table's uuid) after a
+        failure
+        """
+        key = backoff_key or endpoint
+        if time.monotonic() < self.not_before.get(key, 0.0):
+            return None
+        await asyncio.sleep(self.limiters[endpoint].reserve())
+        try:
+            res = await func(*args, **kwargs)
+            if res is None:
+                raise ValueError("empty response")
+        except Exception as e:
+            self.failures[key] = self.failures.get(key, 0) + 1
+            delay = self.backoff.delay(self.failures[key])
+            self.not_before[key] = time.monotonic() + delay
+            self.logger.info(f"{endpoint} failed ({e!r}), backing off for {delay:.1f}s")
+            return None
+        self.forget(key)
+        return res
+
+    def forget(self, key: str):
+        self.failures.pop(key, None)
+        self.not_before.pop(key, None)
+
+    async def poll_table(self, uuid: str):
+        progress = await self.call("progress", self.manager.poll_match, uuid, backoff_key=uuid)
+        if not progress or "scores" not in progress:
+            return
+        last = self.progress.get(uuid)
+        self.progress[uuid] = progress
+        if last is not None:
+            if (progress["chang"], progress["ju"], progress["ben"]) != (last["chang"], last["ju"], last["ben"]):
+                await self.emit({"type": "hand_advanced", "uuid": uuid, "chang": progress["chang"], "ju": progress["ju"], "ben": progress["ben"]})
+            if progress["scores"] != last["scores"]:
+                await self.emit({"type": "score_changed", "uuid": uuid, "scores": progress["scores"], "previous": last["scores"]})
+        if progress.get("is_end"):
+            self.finished.setdefault(uuid, time.monotonic())
+
+    async def fetch_finished(self):
+        """
+        pick the ended games' records out of the newest page of the log
+        """
+        if not self.finished:
+            return
+        logs = await self.call("logs", self.manager.get_logs, offset=0, limit=max(self.logs_page_size, len(self.finished)))
+        if not logs:
+            return
+        records = [r for r in logs["record_list"] if r["uuid"] in self.finished and r["uuid"] not in self.games.uuid_index]
+        if self.store is not None:
+            self.store_page(logs["record_list"])
+        for record in reversed(records):
+            self.games.addGameFromDict(record)
+            self.finished.pop(record["uuid"], None)
+            self.progress.pop(record["uuid"], None)
+            self.forget(record["uuid"])
+            await self.emit({"type": "game_ended", "uuid": record["uuid"], "row": self.games.uuid_index[record["uuid"]]})
+        # terminated games never get a record, stop looking for them after a while
+        for uuid, ended in list(self.finished.items()):
+            if uuid in self.games.uuid_index or time.monotonic() - ended > self.record_timeout:
+                del self.finished[uuid]
+                self.progress.pop(uuid, None)
+                self.forget(uuid)
+
+    def store_page(self, page: List[Dict]):
+        """
+        store every record of the newest log page that is newer than the
+        stored ones, tracked by the monitor or not. `ContestManager.iter_logs`
+        stops paging at the first stored record, so the store must not skip
+        a game: when the page does not reach back to a stored record (or the
+        store is empty) nothing is stored, and the next run fetches them
+        """
+        for i, record in enumerate(page):
+            if record["uuid"] in self.stored:
+                break
+        else:
+            return
+        if i:
+            self.store.add_records(page[:i])
+            self.stored.update(r["uuid"] for r in page[:i])
+
+    async def tick(self):
+        running = await self.call("match_list", self.manager.poll_match_list)
+        if running is not None:
+            live = {g["game_uuid"]: g["players"] for g in running}
+            for uuid in live.keys() - self.live.keys():
+                await self.emit({"type": "game_started", "uuid": uuid, "players": live[uuid]})
+            # tables dropping off the running list have ended even if their last progress did not say so
+            for uuid in self.live.keys() - live.keys():
+                self.finished.setdefault(uuid, time.monotonic())
+            self.live = live
+        await asyncio.gather(*[self.poll_table(uuid) for uuid in self.live if uuid not in self.finished and uuid not in self.games.uuid_index])
+        await self.fetch_finished()
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        stop = stop or asyncio.Event()
+        while not stop.is_set():
+            started = time.monotonic()
+            await self.tick()
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=max(0, self.poll_interval - (time.monotonic() - started)))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,128 @@
+import json
+import threading
+
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from typing import *
+
+from .codec import loads
+
+def requestKey(http_method: str, method: str, params: Optional[Dict], data: Optional[Dict]) -> str:
+    """
+    the same key for a call whether it is seen by the client (python values)
+    or by the stand-in server (query strings and a json body)
+    """
+    params = {k: str(v) for k, v in (params or {}).items() if v is not None}
+    return json.dumps([http_method.upper(), method, params, data], sort_keys=True, ensure_ascii=False)
+
+class ApiRecorder:
+    """
+    appends every response seen by a `TournamentAPI` (and the
+    `AsyncTournamentAPI`s sharing it) to a json lines file:
+
+        api = TournamentLogin(...)
+        api.recorder = ApiRecorder("contest.jsonl")
+
+    the login call is left out, so recordings don't carry tokens
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+
+    def record(self, http_method: str, method: str, params: Optional[Dict], data: Optional[Dict], response):
+        if method == "login":
+            return
+        line = json.dumps({"http_method": http_method.upper(), "method": method, "params": params or {}, "data": data, "response": response}, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class Recording:
+    """
+    responses of an `ApiRecorder` file, served in the order they were
+    recorded. a call made more often than it was recorded gets its last
+    response again
+    """
+    def __init__(self, path: str):
+        self.responses: Dict[str, List] = defaultdict(list)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = loads(line)
+                    self.responses[requestKey(entry["http_method"], entry["method"], entry["params"], entry["data"])].append(entry["response"])
+        self.served: Dict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def __call__(self, http_method: str, method: str, params: Dict, data: Optional[Dict]):
+        if method == "login":
+            return {"data": {"token": "replay"}}
+        key = requestKey(http_method, method, params, data)
+        if not (responses := self.responses.get(key)):
+            return None
+        with self.lock:
+            i = min(self.served[key], len(responses) - 1)
+            self.served[key] += 1
+        return responses[i]
+
+class ReplayServer:
+    """
+    local stand-in for the contest API, answering over http with
+    `responder(http_method, method, params, data)` (a `Recording` or a
+    `synthetic.SyntheticContest`), 404 when it returns None. point a
+    `TournamentLogin` at it with `endpoint=server.endpoint`; the sync and
+    aiohttp clients then run unchanged and fully offline.
+
+    only the default endpoint is served, calls made to other hosts
+    (`fetch_rules`, `poll_match`...) still go to those hosts
+    """
+    def __init__(self, responder: Callable[[str, str, Dict, Optional[Dict]], Any], host: str = "127.0.0.1", port: int = 0):
+        self.responder = responder
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def respond(handler, http_method):
+                url = urlsplit(handler.path)
+                method = url.path.split("/api/", 1)[-1]
+                length = int(handler.headers.get("Content-Length") or 0)
+                body = handler.rfile.read(length) if length else b""
+                response = responder(http_method, method, dict(parse_qsl(url.query)), json.loads(body) if body else None)
+                payload = json.dumps(response, ensure_ascii=False).encode() if response is not None else b"{}"
+                handler.send_response(200 if response is not None else 404)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Content-Length", str(len(payload)))
+                handler.end_headers()
+                handler.wfile.write(payload)
+
+            def do_GET(handler):
+                handler.respond("GET")
+
+            def do_POST(handler):
+                handler.respond("POST")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.endpoint = f"http://{host}:{self.server.server_port}/api/"
+        self.thread = threading.Thread(target=self.server.serve_forever, name="replay server", daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,210 @@
+import itertools
+import xlsxwriter
+import pandas as pd
+
+from datetime import datetime
+from typing import *
+
+from .helper import Game, PlayerPool, Teams
+
+DAYS = ["一","二","三","四","五","六","日"]
+
+def color_strtoint(color_str):
+    try:
+        assert len(color_str) == 6
+    except:
+        return -1, -1, -1
+    return int(color_str[0:2], 16), int(color_str[2:4], 16), int(color_str[4:6], 16)
+
+def ContrastColor(r, g, b):
+    return "000000" if (0.299 * r + 0.587 * g + 0.114 * b)/255 > 0.5 else "ffffff"
+
+class ReportWriter:
+    """
+    writes the stats workbook row by row in xlsxwriter's `constant_memory`
+    mode. instead of one conditional format rule per team and column block,
+    the team colour (and the score / top highlights) of every cell is
+    resolved from the known team mapping when the row is written, so the
+    file carries plain cell formats only.
+
+    sheets have to be written top to bottom: in `constant_memory` mode a
+    row can no longer be changed once a later row has been written.
+    """
+    def __init__(self, filename: str, teams: Teams, time_now: datetime, note: str):
+        self.workbook = xlsxwriter.Workbook(filename, {"constant_memory": True})
+        self.teams = teams
+        self.time_now = time_now
+        self.note = note
+        formats = {}
+        workbook = self.workbook
+        formats["score"] = workbook.add_format({"bg_color": "#FAF0CE", "font_color": "#000000", "align": "center"})
+        formats["score_red"] = workbook.add_format({"bg_color": "#FAF0CE", "font_color": "#FF0000", "align": "center"})
+        formats["simple_red"] = workbook.add_format({"font_color": "#FF0000", "align": "center"})
+        formats["top"] = workbook.add_format({"bg_color": "#FF66CC", "font_color": "#000000", "align": "center"})
+        formats["title"] = workbook.add_format({"bold": True, "align": "center"})
+        formats["title_red"] = workbook.add_format({"bold": True, "align": "center", "font_color": "#FF0000"})
+        formats["noteL"] = workbook.add_format({"bold": True, "align": "left"})
+        formats["noteR"] = workbook.add_format({"bold": True, "align": "right"})
+        formats["center"] = workbook.add_format({"align": "center", "valign": "vcenter"})
+        # same look as the header pandas.to_excel writes
+        formats["header"] = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        self.team_formats = {}
+        for team in teams.teams:
+            r,g,b = color_strtoint(team_color := team.color)
+            self.team_formats[team.name] = workbook.add_format({"bg_color": f"#{team_color}", "font_color": f"#{ContrastColor(r,g,b)}", "align": "center"})
+        self.formats = formats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.workbook.close()
+
+    def teamFormat(self, team_name):
+        return self.team_formats.get(team_name)
+
+    def scoreFormat(self, value):
+        if value is None:
+            return None
+        return self.formats["score_red"] if value < 0 else self.formats["score"]
+
+    def writeTable(self, worksheet, df: pd.DataFrame, startrow: int, index: bool, cell_format: Callable[[list, int], Any]):
+        """
+        header and rows of `df` from `startrow` on. `cell_format(row, col)`
+        picks the format of each data cell from the row's values (index
+        included when `index` is set), None leaves the column format
+        """
+        header = ([df.index.name or ""] if index else []) + [str(c) for c in df.columns]
+        worksheet.write_row(startrow, 0, header, self.formats["header"])
+        values = df.astype(object).where(df.notna(), None).values.tolist()
+        for r, (idx, row) in enumerate(zip(df.index, values)):
+            row = ([idx] if index else []) + row
+            fmts = [self.formats["header"] if index and c == 0 else cell_format(row, c) for c in range(len(row))]
+            # one write_row per run of cells sharing a format
+            c = 0
+            for fmt, run in itertools.groupby(zip(row, fmts), key=lambda cell: id(cell[1])):
+                run = list(run)
+                worksheet.write_row(startrow + 1 + r, c, [value for value, _ in run], run[0][1])
+                c += len(run)
+
+    def writePlayers(self, sheet_name, df: pd.DataFrame, title: str, index: bool, highlight_top: bool):
+        """
+        player tables (队伍 and 选手 in columns B:C, 积分 in D)
+        """
+        worksheet = self.workbook.add_worksheet(sheet_name)
+        if not index:
+            worksheet.set_column(0, 0, 8, self.formats["title"])
+        worksheet.set_column(1, 2, 30, self.formats["center"])
+        worksheet.set_column(3, 5, 8, self.formats["center"])
+        worksheet.set_column(6, 9, 6, self.formats["center"])
+        worksheet.set_column(10, 13, 8, self.formats["center"])
+        worksheet.merge_range("A1:N1", title, self.formats["title"])
+
+        # columns G, K:N highlight their best value
+        top_cols = {6, 10, 11, 12, 13} if highlight_top else set()
+        offset = 1 if index else 0
+        tops = {c: df.iloc[:, c - offset].max() for c in top_cols}
+        def cell_format(row, c):
+            if c in (1, 2):
+                return self.teamFormat(row[1])
+            if c == 3:
+                return self.scoreFormat(row[3])
+            if c in tops and row[c] is not None and row[c] == tops[c]:
+                return self.formats["top"]
+            return None
+        self.writeTable(worksheet, df, 1, index, cell_format)
+
+        rows, _ = df.shape
+        worksheet.merge_range(f"A{rows+3}:F{rows+3}", self.note, self.formats["noteL"])
+        worksheet.merge_range(f"G{rows+3}:N{rows+3}", f'{self.time_now.strftime("%m月%d日")} 终了时点', self.formats["noteR"])
+
+    def writeTeamTotal(self, sheet_name, df: pd.DataFrame, title: str):
+        worksheet = self.workbook.add_worksheet(sheet_name)
+        worksheet.set_column(1, 1, 30, self.formats["center"])
+        worksheet.set_column(2, 5, 8, self.formats["center"])
+        worksheet.set_column(6, 9, 6, self.formats["center"])
+        worksheet.merge_range("A1:J1", title, self.formats["title"])
+        def cell_format(row, c):
+            if c == 1:
+                return self.teamFormat(row[1])
+            if c == 2:
+                return self.scoreFormat(row[2])
+            if c == 4 and row[4] is not None and row[4] < 0:
+                return self.formats["simple_red"]
+            return None
+        self.writeTable(worksheet, df, 1, True, cell_format)
+        rows, _ = df.shape
+        worksheet.merge_range(f"D{rows+3}:J{rows+3}", f'{self.time_now.strftime("%m月%d日")} 终了时点', self.formats["noteR"])
+
+    def writeLogs(self, sheet_name, df: pd.DataFrame):
+        """
+        game log with the team columns, each seat block of 4 columns takes
+        the colour of the team in its second column
+        """
+        worksheet = self.workbook.add_worksheet(sheet_name)
+        worksheet.set_column(0, 1, 18, self.formats["center"])
+        for i in range(2,17,4):
+            worksheet.set_column(i, i+1, 20, self.formats["center"])
+            worksheet.set_column(i+2, i+3, 12, self.formats["center"])
+        def cell_format(row, c):
+            if 2 <= c < 18:
+                return self.teamFormat(row[c - (c - 2) % 4 + 1])
+            return None
+        self.writeTable(worksheet, df, 0, False, cell_format)
+
+    def writeMatchup(self, sheet_name, last_games: List[Game], teams: Teams, players: PlayerPool):
+        """
+        the last match day, one block of up to two hanchan per group of four
+        teams. cells are collected first and then written in row order
+        """
+        worksheet = self.workbook.add_worksheet(sheet_name)
+        worksheet.set_column(0, 4, 20)
+        if not last_games:
+            return
+        cells: Dict[Tuple[int, int], Tuple[Any, Any]] = {}
+        merges: Dict[int, Tuple[Any, Any]] = {}
+        last_gametime = max(game.start_time for game in last_games)
+        cells[(0, 0)] = (f'{last_gametime.strftime("%m/%d")} (周{DAYS[last_gametime.weekday()]})', self.formats["title_red"])
+        all_teams = set([teams.getPlayerTeam(p["account_id"]) for x in last_games for p in x.players])
+        teams_game = [set([teams.getPlayerTeam(p["account_id"]) for p in last_games[0].players])]
+        if (len(all_teams) > 4):
+            teams_game.append(all_teams - teams_game[0])
+
+        for i in range(len(teams_game)):
+            i_0 = 10*i+2
+            x = 0
+            teams_game_tmp = list(teams_game[i])
+            for k in range(min(4, len(teams_game_tmp))):
+                teamname_tmp = teams_game_tmp[k]
+                cells[(i_0-2, k+1)] = (teamname_tmp, self.teamFormat(teamname_tmp))
+            cells[(i_0-1, 0)] = ("第1半庄", self.formats["title"])
+            cells[(i_0+3, 0)] = ("第2半庄", self.formats["title"])
+            for j in range(2):
+                cells[(i_0+4*j, 0)] = ("马点", self.formats["title"])
+                cells[(i_0+4*j+1, 0)] = ("分数", self.formats["title"])
+                cells[(i_0+4*j+2, 0)] = ("赛事牌谱", self.formats["title"])
+
+            for game in last_games:
+                if teams.getPlayerTeam(game.players[0]["account_id"]) in teams_game_tmp:
+                    players_team = [teams.getPlayerTeam(p["account_id"]) for p in game.players]
+                    players_idx = [teams_game_tmp.index(p) for p in players_team]
+                    for y in range(len(players_idx)):
+                        fmt = self.teamFormat(players_team[y])
+                        cells[(i_0-1+4*x, players_idx[y]+1)] = (players.getNickname(game.players[y]["account_id"], game.players[y]["nickname"]), fmt)
+                        cells[(i_0+4*x, players_idx[y]+1)] = (game.players[y]["part_point_1"], fmt)
+                        cells[(i_0+1+4*x, players_idx[y]+1)] = (game.players[y]["total_point"] / 1000, fmt)
+                    merges[i_0+2+4*x] = ("https://game.maj-soul.com/1/?paipu="+game.uuid, self.formats["score"])
+                    x += 1
+
+        for r in sorted(set(r for r, _ in cells) | set(merges)):
+            if (r, 0) in cells:
+                worksheet.write(r, 0, *cells[(r, 0)])
+            if r in merges:
+                worksheet.merge_range(r, 1, r, 4, *merges[r])
+            else:
+                for c in range(1, 5):
+                    if (r, c) in cells:
+                        worksheet.write(r, c, *cells[(r, c)])
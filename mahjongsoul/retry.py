@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+
+from typing import *
+from urllib.parse import urlsplit
+
+# kinds of failed calls, see `classify`
+CONNECT = "connect"        # the request never reached the server
+NETWORK = "network"        # connection lost or timed out after the request was sent
+SERVER = "server"          # 5xx
+RATE_LIMIT = "rate_limit"  # 429
+AUTH = "auth"              # 401 / 403, handled by logging in again
+CLIENT = "client"          # other 4xx, resending won't help
+DECODE = "decode"          # 2xx without a json body
+
+def classify(status: int) -> Optional[str]:
+    """
+    kind of failure of an http status, None for a success
+    """
+    if status in (401, 403):
+        return AUTH
+    if status == 429:
+        return RATE_LIMIT
+    if status >= 500:
+        return SERVER
+    if status >= 400:
+        return CLIENT
+    return None
+
+class RetryPolicy:
+    """
+    which failures are retried and how long to wait in between: exponential
+    backoff from `base` up to `cap` seconds with full jitter, or the server's
+    Retry-After when it sends one. a call is tried `max_attempts` times at
+    most.
+
+    POSTs change things on the server, so they are only resent when it can
+    not have acted on them (`post_retry_on`)
+    """
+    def __init__(self, max_attempts: int = 4, base: float = 0.5, cap: float = 30,
+                 retry_on: Collection[str] = (CONNECT, NETWORK, SERVER, RATE_LIMIT, DECODE),
+                 post_retry_on: Collection[str] = (CONNECT, RATE_LIMIT)):
+        self.max_attempts = max_attempts
+        self.base = base
+        self.cap = cap
+        self.retry_on = set(retry_on)
+        self.post_retry_on = set(post_retry_on)
+
+    def should_retry(self, http_method: str, kind: str, attempt: int) -> bool:
+        if attempt >= self.max_attempts:
+            return False
+        return kind in (self.post_retry_on if http_method.upper() == "POST" else self.retry_on)
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(self.cap, max(0.0, retry_after))
+        return random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+
+class TokenBucket:
+    """
+    `rate` calls per second with bursts of up to `burst` calls, shared by
+    threads and event loops alike: `reserve()` takes a token and returns how
+    long the caller has to wait before using it
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+class CircuitBreaker:
+    """
+    stops calling a host after `failure_threshold` failures in a row. after
+    `reset_timeout` seconds one trial call is let through, its success
+    closes the circuit again and its failure keeps it open for another
+    `reset_timeout`
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.trial = True
+                return True
+            return False
+
+    def record(self, success: bool):
+        with self.lock:
+            if success:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.trial or self.failures >= self.failure_threshold:
+                    self.opened_at = time.monotonic()
+            self.trial = False
+
+class HostGuard:
+    """
+    one token bucket and one circuit breaker per host. `rates` sets the
+    calls per second of given hosts (host:port as in the url), the others
+    get `default_rate`
+    """
+    def __init__(self, default_rate: float = 10, rates: Optional[Dict[str, float]] = None,
+                 failure_threshold: int = 5, reset_timeout: float = 30):
+        self.default_rate = default_rate
+        self.rates = rates or {}
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+
+    def host(self, url: str) -> str:
+        return urlsplit(url).netloc
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self.lock:
+            if host not in self.buckets:
+                rate = self.rates.get(host, self.default_rate)
+                self.buckets[host] = TokenBucket(rate, burst=max(1, int(rate)))
+            return self.buckets[host]
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self.breakers[host]
+
+def retry_after(value: Optional[str]) -> Optional[float]:
+    # only the delta-seconds form, an http date falls back to the backoff
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,342 @@
+import bisect
+import io
+import numpy as np
+
+from datetime import date, datetime, timedelta
+from sortedcontainers import SortedList
+from typing import *
+
+from .helper import EPOCH_ORDINAL, PlayerPool, PlayerStats, Teams, Games, splitTies
+from .store import GameStore
+
+class Standings:
+    """
+    player and team standings that can be updated one game at a time.
+
+    per-player and per-team totals live in numpy arrays, and both rankings
+    are kept in `SortedList`s keyed by (-points, row), so `applyGame` costs
+    O(log n) per seat and positions, gaps (差值) and the cutoff line (晋级线)
+    are read off the ordered lists without re-sorting. the first `advancing`
+    teams are above the cutoff line.
+
+    points are kept in raw game units (1000 = 1.0 in the sheets), which keeps
+    sums of whole and tie-split halves exact.
+    """
+    def __init__(self, players: PlayerPool, teams: Teams, advancing: int = 6):
+        self.players = players
+        self.teams = teams
+        self.advancing = advancing
+        self.account_ids = [p.mjsId for p in players.players]
+        self.rows: dict[int, int] = {}
+        for i, account_id in enumerate(self.account_ids):
+            self.rows.setdefault(account_id, i)
+        n = len(self.account_ids)
+        self.points = np.zeros(n, dtype=np.float64)
+        self.game_count = np.zeros(n, dtype=np.int64)
+        self.rank_count = np.zeros((n, 4), dtype=np.int64)
+        self.highest = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+        self.point_sum = np.zeros(n, dtype=np.float64)
+        self.point_sq_sum = np.zeros(n, dtype=np.float64)
+
+        # teams without any player in the pool are left out, like a groupby would
+        player_teams = [p.team or teams.getPlayerTeam(a) for a, p in zip(self.account_ids, players.players)]
+        self.team_names = [t.name for t in teams.teams if t.name in set(player_teams)]
+        self.team_rows = {name: i for i, name in enumerate(self.team_names)}
+        self.player_team = np.array([self.team_rows.get(name, -1) for name in player_teams], dtype=np.int64).reshape(n)
+        m = len(self.team_names)
+        self.team_points = np.zeros(m, dtype=np.float64)
+        self.team_game_count = np.zeros(m, dtype=np.int64)
+        self.team_rank_count = np.zeros((m, 4), dtype=np.int64)
+
+        self.player_order = SortedList()
+        self.team_order = SortedList()
+        self.__rebuildOrder()
+
+    def __rebuildOrder(self):
+        self.player_order = SortedList(zip((-self.points).tolist(), range(len(self.points))))
+        self.team_order = SortedList(zip((-self.team_points).tolist(), range(len(self.team_points))))
+
+    @classmethod
+    def fromGames(cls, players: PlayerPool, teams: Teams, games: Games, advancing: int = 6):
+        """
+        standings of the whole log at once (vectorized), ready for `applyGame`
+        """
+        standings = cls(players, teams, advancing)
+        stats = PlayerStats.fromGames(standings.account_ids, games)
+        standings.points = stats.rank_pt
+        standings.game_count = stats.total_game_count
+        standings.rank_count = stats.rank_count
+        standings.highest = np.where(stats.total_game_count > 0, stats.highest, np.iinfo(np.int64).min)
+        standings.point_sum = stats.point_sum
+        standings.point_sq_sum = stats.point_sq_sum
+        standings.__sumTeams()
+        standings.__rebuildOrder()
+        return standings
+
+    @classmethod
+    def fromSnapshot(cls, players: PlayerPool, teams: Teams, snapshot: Optional["StandingsSnapshot"], advancing: int = 6):
+        """
+        standings as of `snapshot` (empty for None), ready for `applyGame`
+        """
+        standings = cls(players, teams, advancing)
+        if snapshot is not None and len(snapshot.account_ids):
+            pool_ids = np.asarray(standings.account_ids, dtype=np.int64)
+            pos = np.minimum(np.searchsorted(snapshot.account_ids, pool_ids), len(snapshot.account_ids) - 1)
+            found = snapshot.account_ids[pos] == pool_ids
+            pos = pos[found]
+            standings.points[found] = snapshot.points[pos]
+            standings.game_count[found] = snapshot.game_count[pos]
+            standings.rank_count[found] = snapshot.rank_count[pos]
+            standings.highest[found] = snapshot.highest[pos]
+            standings.point_sum[found] = snapshot.point_sum[pos]
+            standings.point_sq_sum[found] = snapshot.point_sq_sum[pos]
+        standings.__sumTeams()
+        standings.__rebuildOrder()
+        return standings
+
+    def __sumTeams(self):
+        on_team = self.player_team >= 0
+        m = len(self.team_names)
+        self.team_points = np.bincount(self.player_team[on_team], weights=self.points[on_team], minlength=m)
+        self.team_game_count = np.bincount(self.player_team[on_team], weights=self.game_count[on_team], minlength=m).astype(np.int64)
+        for r in range(4):
+            self.team_rank_count[:, r] = np.bincount(self.player_team[on_team], weights=self.rank_count[on_team, r], minlength=m)
+
+    def applyGame(self, games: Games, row: int):
+        """
+        add the result of game `row` of `games`. tied players share the
+        better placement, as in `PlayerStats.fromGames`
+        """
+        account_ids = games.account_ids[row]
+        part_points = games.part_points[row]
+        total_points = games.total_points[row]
+        for seat in range(4):
+            if (i := self.rows.get(int(account_ids[seat]))) is None:
+                continue
+            rank = int((part_points > part_points[seat]).sum())
+            points = float(total_points[seat])
+            self.player_order.remove((-float(self.points[i]), i))
+            self.points[i] += points
+            self.player_order.add((-float(self.points[i]), i))
+            self.game_count[i] += 1
+            self.rank_count[i, rank] += 1
+            self.highest[i] = max(self.highest[i], int(part_points[seat]))
+            self.point_sum[i] += points / 1000
+            self.point_sq_sum[i] += (points / 1000)**2
+            if (t := int(self.player_team[i])) >= 0:
+                self.team_order.remove((-float(self.team_points[t]), t))
+                self.team_points[t] += points
+                self.team_order.add((-float(self.team_points[t]), t))
+                self.team_game_count[t] += 1
+                self.team_rank_count[t, rank] += 1
+
+    def playerRanking(self) -> list[int]:
+        return [self.account_ids[i] for _, i in self.player_order]
+
+    def teamRanking(self) -> list[str]:
+        return [self.team_names[t] for _, t in self.team_order]
+
+    def playerPosition(self, account_id) -> int:
+        i = self.rows[account_id]
+        return self.player_order.index((-float(self.points[i]), i)) + 1
+
+    def teamPosition(self, team_name) -> int:
+        t = self.team_rows[team_name]
+        return self.team_order.index((-float(self.team_points[t]), t)) + 1
+
+    def teamGap(self, team_name) -> float:
+        # points behind the team ranked right above, nan for the leader
+        pos = self.teamPosition(team_name) - 1
+        if pos == 0:
+            return float("nan")
+        return (self.team_points[self.team_order[pos - 1][1]] - self.team_points[self.team_order[pos][1]]) / 1000
+
+    def teamCutoff(self, team_name) -> float:
+        # margin over the first team below the line when advancing, deficit to the last team above it otherwise
+        pos = self.teamPosition(team_name) - 1
+        other = self.advancing if pos < self.advancing else self.advancing - 1
+        if not 0 <= other < len(self.team_order):
+            return float("nan")
+        return (self.team_points[self.team_order[pos][1]] - self.team_points[self.team_order[other][1]]) / 1000
+
+    def exportToDict(self, extended=False):
+        """
+        same columns as `PlayerPool.exportToDict`, rows in ranking order
+        """
+        order = np.array([i for _, i in self.player_order], dtype=np.int64)
+        stats = PlayerStats(
+            rank_pt=self.points[order],
+            total_game_count=self.game_count[order],
+            rank_count=self.rank_count[order].reshape(len(order), 4),
+            highest=np.where(self.game_count[order] > 0, self.highest[order], 0),
+            point_sum=self.point_sum[order],
+            point_sq_sum=self.point_sq_sum[order],
+            point_games=self.game_count[order],
+        )
+        data = {
+            "队伍": [self.players.players[i].team for i in order],
+            "选手": [self.players.players[i].nickname for i in order],
+        }
+        data.update(stats.exportToDict(extended))
+        return data
+
+    def exportTeamsToDict(self):
+        order = np.array([t for _, t in self.team_order], dtype=np.int64)
+        points = self.team_points[order] / 1000
+        cutoff = np.full(len(order), np.nan)
+        if self.advancing < len(order):
+            cutoff[:self.advancing] = points[:self.advancing] - points[self.advancing]
+        if 0 < self.advancing <= len(order):
+            cutoff[self.advancing:] = points[self.advancing:] - points[self.advancing - 1]
+        return {
+            "队伍": [self.team_names[t] for t in order],
+            "积分": points.tolist(),
+            "差值": np.concatenate([[np.nan], -np.diff(points)]).tolist() if len(order) else [],
+            "晋级线": cutoff.tolist(),
+            "试合数": self.team_game_count[order].tolist(),
+            "1着": self.team_rank_count[order, 0].tolist(),
+            "2着": self.team_rank_count[order, 1].tolist(),
+            "3着": self.team_rank_count[order, 2].tolist(),
+            "4着": self.team_rank_count[order, 3].tolist(),
+        }
+
+class StandingsSnapshot:
+    """
+    totals of every account that has played, as of the end of match day
+    `day`: the per-player columns of `Standings`, rows keyed by the sorted
+    `account_ids`. team totals are summed when the snapshot is restored, so
+    it holds for any team lineup
+    """
+    __slots__ = ("day", "account_ids", "points", "game_count", "rank_count", "highest", "point_sum", "point_sq_sum")
+    COLUMNS = __slots__[1:]
+
+    def __init__(self, day: date, account_ids, points, game_count, rank_count, highest, point_sum, point_sq_sum):
+        self.day = day
+        self.account_ids = account_ids
+        self.points = points
+        self.game_count = game_count
+        self.rank_count = rank_count
+        self.highest = highest
+        self.point_sum = point_sum
+        self.point_sq_sum = point_sq_sum
+
+    def toBytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **{name: getattr(self, name) for name in self.COLUMNS})
+        return buffer.getvalue()
+
+    @classmethod
+    def fromBytes(cls, day: date, data: bytes):
+        with np.load(io.BytesIO(data)) as arrays:
+            return cls(day, **{name: arrays[name] for name in cls.COLUMNS})
+
+class StandingsHistory:
+    """
+    standings as of any past moment without going through the whole log.
+    `checkpoint` takes a `StandingsSnapshot` at the end of every finished
+    match day, and `standingsAt` restores the last snapshot before the
+    moment asked for and replays only the games after it, at most one day's
+    worth once the finished days are checkpointed.
+
+    snapshots are kept across runs in the `GameStore` (see `load` and
+    `save`). a day is only checkpointed a day after it is over, and
+    snapshots whose game count no longer matches the log (a game that was
+    still running or not yet listed) are taken again
+    """
+    def __init__(self, snapshots: Iterable[StandingsSnapshot] = ()):
+        self.snapshots: list[StandingsSnapshot] = sorted(snapshots, key=lambda s: s.day)
+        self.days = [s.day for s in self.snapshots]
+
+    @classmethod
+    def load(cls, store: GameStore):
+        return cls(StandingsSnapshot.fromBytes(date.fromisoformat(day), data) for day, data in store.iter_snapshots())
+
+    def save(self, store: GameStore, snapshots: list[StandingsSnapshot]):
+        store.add_snapshots([(s.day.isoformat(), s.toBytes()) for s in snapshots])
+
+    def checkpoint(self, games: Games, until: date = None) -> list[StandingsSnapshot]:
+        """
+        snapshot every match day of `games` after the last snapshot and
+        before `until` (by default yesterday in the log's timezone, so games
+        running past midnight are in). returns the new snapshots, including
+        the ones taken again
+        """
+        until = until or datetime.now(games.tz).date() - timedelta(days=1)
+        seat_days = np.repeat(games.localDays(), 4)
+        if self.snapshots:
+            # seats played up to the end of each snapshot's day, by the log and by the snapshot
+            snapshot_days = np.array([s.day.toordinal() - EPOCH_ORDINAL for s in self.snapshots], dtype=np.int64)
+            logged = np.searchsorted(np.sort(seat_days), snapshot_days, side="right")
+            stale = np.flatnonzero(logged != np.array([int(s.game_count.sum()) for s in self.snapshots]))
+            if len(stale):
+                del self.snapshots[stale[0]:]
+                del self.days[stale[0]:]
+        last = self.snapshots[-1] if self.snapshots else None
+        new = seat_days < until.toordinal() - EPOCH_ORDINAL
+        if last is not None:
+            new &= seat_days > last.day.toordinal() - EPOCH_ORDINAL
+        if not new.any():
+            return []
+
+        seat_ids = games.account_ids.ravel()
+        universe = np.union1d(seat_ids[new], last.account_ids if last is not None else np.zeros(0, dtype=np.int64))
+        n = len(universe)
+        points = np.zeros(n, dtype=np.float64)
+        game_count = np.zeros(n, dtype=np.int64)
+        rank_count = np.zeros((n, 4), dtype=np.int64)
+        highest = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+        point_sum = np.zeros(n, dtype=np.float64)
+        point_sq_sum = np.zeros(n, dtype=np.float64)
+        if last is not None:
+            pos = np.searchsorted(universe, last.account_ids)
+            points[pos], game_count[pos], rank_count[pos] = last.points, last.game_count, last.rank_count
+            highest[pos], point_sum[pos], point_sq_sum[pos] = last.highest, last.point_sum, last.point_sq_sum
+
+        places, _, _ = splitTies(games.part_points, games.total_points)
+        seats = np.flatnonzero(new)
+        seats = seats[np.argsort(seat_days[seats], kind="stable")]
+        days, starts = np.unique(seat_days[seats], return_index=True)
+        snapshots = []
+        for day, day_seats in zip(days, np.split(seats, starts[1:])):
+            owner = np.searchsorted(universe, seat_ids[day_seats])
+            seat_totals = games.total_points.ravel()[day_seats]
+            points += np.bincount(owner, weights=seat_totals, minlength=n)
+            game_count += np.bincount(owner, minlength=n)
+            rank_count += np.bincount(owner * 4 + places.ravel()[day_seats], minlength=4 * n).reshape(n, 4)
+            np.maximum.at(highest, owner, games.part_points.ravel()[day_seats])
+            point_sum += np.bincount(owner, weights=seat_totals / 1000, minlength=n)
+            point_sq_sum += np.bincount(owner, weights=(seat_totals / 1000)**2, minlength=n)
+            played = game_count > 0
+            snapshots.append(StandingsSnapshot(
+                date.fromordinal(EPOCH_ORDINAL + int(day)), universe[played], points[played], game_count[played],
+                rank_count[played], highest[played], point_sum[played], point_sq_sum[played],
+            ))
+        self.snapshots += snapshots
+        self.days += [s.day for s in snapshots]
+        return snapshots
+
+    def standingsAt(self, players: PlayerPool, teams: Teams, games: Games, when: Union[date, datetime], advancing: int = 6) -> Standings:
+        """
+        standings of the games started before `when`, or up to the end of
+        that day when `when` is a date
+        """
+        if not isinstance(when, datetime):
+            when = datetime(when.year, when.month, when.day, tzinfo=games.tz) + timedelta(days=1)
+        # a snapshot covers its whole day, so it has to end by `when`
+        i = bisect.bisect_right(self.days, when.astimezone(games.tz).date() - timedelta(days=1))
+        snapshot = self.snapshots[i - 1] if i else None
+        standings = Standings.fromSnapshot(players, teams, snapshot, advancing)
+        start = None
+        if snapshot is not None:
+            start = datetime(snapshot.day.year, snapshot.day.month, snapshot.day.day, tzinfo=games.tz) + timedelta(days=1)
+        rows = games.getGamesBetween(start, when)
+        for row in rows[np.argsort(games.start_times[rows], kind="stable")]:
+            standings.applyGame(games, int(row))
+        return standings
+
+    def teamRankings(self, players: PlayerPool, teams: Teams, advancing: int = 6) -> dict[date, list[str]]:
+        """
+        team ranking at the end of every checkpointed match day, straight
+        from the snapshots (for rank movement charts)
+        """
+        return {s.day: Standings.fromSnapshot(players, teams, s, advancing).teamRanking() for s in self.snapshots}
@@ -0,0 +1,104 @@
+import json
+import sqlite3
+from typing import *
+
+from .codec import loads
+
+class GameStore:
+    """
+    local sqlite copy of a season's game records, keyed by game uuid, and of
+    the standings snapshots taken at its match-day boundaries.
+
+    finished games never change, so a run only needs to fetch the records
+    newer than the ones already stored here (see `ContestManager.iter_logs`
+    and its `known_uuids` argument). records are kept in the order the
+    contest API returns them, newest first. that only holds while the store
+    has no gap, a store holding fewer records than the contest API counts
+    is filled again with `replace_records`.
+    """
+    def __init__(self, path: str, contest_unique_id, season_id: int):
+        self.contest_unique_id = str(contest_unique_id)
+        self.season_id = int(season_id)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS game_records ("
+            "contest_unique_id TEXT NOT NULL, season_id INTEGER NOT NULL, uuid TEXT NOT NULL, "
+            "seq INTEGER NOT NULL, start_time INTEGER NOT NULL, record TEXT NOT NULL, "
+            "PRIMARY KEY (contest_unique_id, season_id, uuid))"
+        )
+        # `standings.StandingsSnapshot`s by match day (iso date)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS standings_snapshots ("
+            "contest_unique_id TEXT NOT NULL, season_id INTEGER NOT NULL, day TEXT NOT NULL, snapshot BLOB NOT NULL, "
+            "PRIMARY KEY (contest_unique_id, season_id, day))"
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM game_records WHERE contest_unique_id = ? AND season_id = ?",
+            (self.contest_unique_id, self.season_id)
+        ).fetchone()[0]
+
+    def known_uuids(self) -> Set[str]:
+        return {row[0] for row in self.conn.execute(
+            "SELECT uuid FROM game_records WHERE contest_unique_id = ? AND season_id = ?",
+            (self.contest_unique_id, self.season_id)
+        )}
+
+    def add_records(self, records: List[Dict]):
+        """
+        store `records`, a newest-first batch of records that are all newer
+        than the ones already stored.
+        """
+        top = self.conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM game_records WHERE contest_unique_id = ? AND season_id = ?",
+            (self.contest_unique_id, self.season_id)
+        ).fetchone()[0]
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO game_records VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.contest_unique_id, self.season_id, r["uuid"], top + len(records) - i, r["start_time"], json.dumps(r, ensure_ascii=False))
+             for i, r in enumerate(records)]
+        )
+        self.conn.commit()
+
+    def replace_records(self, records: List[Dict]):
+        """
+        replace the stored records with `records`, the season's whole log
+        newest first
+        """
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM game_records WHERE contest_unique_id = ? AND season_id = ?",
+                (self.contest_unique_id, self.season_id)
+            )
+        self.add_records(records)
+
+    def iter_records(self) -> Iterator[Dict]:
+        for (record,) in self.conn.execute(
+            "SELECT record FROM game_records WHERE contest_unique_id = ? AND season_id = ? ORDER BY seq DESC",
+            (self.contest_unique_id, self.season_id)
+        ):
+            yield loads(record)
+
+    def add_snapshots(self, snapshots: List[Tuple[str, bytes]]):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO standings_snapshots VALUES (?, ?, ?, ?)",
+            [(self.contest_unique_id, self.season_id, day, snapshot) for day, snapshot in snapshots]
+        )
+        self.conn.commit()
+
+    def iter_snapshots(self) -> Iterator[Tuple[str, bytes]]:
+        yield from self.conn.execute(
+            "SELECT day, snapshot FROM standings_snapshots WHERE contest_unique_id = ? AND season_id = ? ORDER BY day",
+            (self.contest_unique_id, self.season_id)
+        )
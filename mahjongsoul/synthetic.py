@@ -0,0 +1,82 @@
+import random
+
+from typing import *
+
+from .helper import START_POINTS, UMA
+
+class SyntheticContest:
+    """
+    a made-up contest of `teams` teams of `players_per_team` players and
+    `games` hanchan, for testing and benchmarking without credentials. the
+    same `seed` always gives the same contest.
+
+    every day the teams are drawn into groups of four (leftover teams sit
+    out) and the groups take turns at the `games_per_day` games of the day,
+    starting at `start_time`. about one game in `tie_every` has a two-way
+    tie for first and one in `tie_every`**2 a three-way tie, so the tie
+    handling is exercised too.
+
+    can be called as a `replay.ReplayServer` responder, it answers the calls
+    made by stats.py
+    """
+    def __init__(self, teams: int = 8, players_per_team: int = 4, games: int = 300, seed: int = 0,
+                 games_per_day: int = 8, start_time: int = 1750000000, tie_every: int = 7):
+        if teams < 4:
+            raise ValueError("a contest needs at least 4 teams")
+        rnd = random.Random(seed)
+        self.season_id = 1
+        self.teams = []
+        self.members: Dict[int, List[Dict]] = {}
+        account_id = 100000
+        for t in range(teams):
+            team_id = t + 1
+            self.teams.append({"team_id": team_id, "name": f"Team{t:02d}", "detail": "%06x" % rnd.randrange(1 << 24)})
+            self.members[team_id] = []
+            for k in range(players_per_team):
+                account_id += 1
+                self.members[team_id].append({"account_id": account_id, "nickname": f"player{t:02d}_{k:02d}"})
+
+        self.records = []
+        groups = []
+        for g in range(games):
+            if g % games_per_day == 0:
+                drawn = rnd.sample(range(1, teams + 1), teams)
+                groups = [drawn[i:i + 4] for i in range(0, teams - teams % 4, 4)]
+            group = groups[(g % games_per_day) % len(groups)]
+            players = [rnd.choice(self.members[team_id]) for team_id in rnd.sample(group, 4)]
+            points = [rnd.randrange(-200, 900) * 100 for _ in range(4)]
+            if g % tie_every == 0:
+                points[1] = points[0]
+            if g % (tie_every**2) == 0:
+                points[2] = points[0]
+            points[3] += 4 * START_POINTS - sum(points)
+            seats = rnd.sample(range(4), 4)
+            order = sorted(range(4), key=lambda i: (-points[i], seats[i]))
+            start = start_time + (g // games_per_day) * 86400 + (g % games_per_day) * 1800
+            self.records.append({
+                "uuid": f"{g:06d}-synthetic-{seed}",
+                "start_time": start,
+                "end_time": start + 2400,
+                "accounts": [{"account_id": players[i]["account_id"], "seat": seats[i], "nickname": players[i]["nickname"]} for i in range(4)],
+                "result": {"players": [{"seat": seats[i], "part_point_1": points[i], "total_point": points[i] - START_POINTS + UMA[rank]} for rank, i in enumerate(order)]},
+            })
+        # the contest api lists the newest games first
+        self.records.reverse()
+
+    def __call__(self, http_method: str, method: str, params: Dict, data: Optional[Dict]):
+        args = {**params, **(data or {})}
+        if method == "login":
+            return {"data": {"token": "synthetic"}}
+        if method == "contest/fetch_contest_season_list":
+            return {"data": [{"season_id": self.season_id, "state": 2}]}
+        if method == "contest/fetch_contest_team_list":
+            offset, limit = int(args.get("offset", 0)), int(args.get("limit", 300))
+            return {"data": {"total": len(self.teams), "list": self.teams[offset:offset + limit]}}
+        if method == "contest/fetch_contest_team_member_list":
+            members = self.members.get(int(args["team_id"]), [])
+            offset, limit = int(args.get("offset", 0)), int(args.get("limit", 10))
+            return {"data": {"total": len(members), "list": members[offset:offset + limit]}}
+        if method == "contest/fetch_contest_game_records":
+            offset, limit = int(args.get("offset", 0)), int(args.get("limit", 10))
+            return {"data": {"total": len(self.records), "record_list": self.records[offset:offset + limit]}}
+        return None
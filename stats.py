@@ -1,257 +1,455 @@
-import asyncio
-import aiohttp
+from __future__ import annotations
+
+import argparse
 import json
 import os
+import sys
+import threading
+import time
+import typing
 import dotenv
-import pandas as pd
-import xlsxwriter
 import datetime
 
+from concurrent.futures import ThreadPoolExecutor
 from os.path import join, dirname
 
-from mahjongsoul.helper import *
-from mahjongsoul.manager import *
+from mahjongsoul.manager import ContestAPIError, ContestManager, ResponseCache, TournamentAPI, TournamentLogin
+from mahjongsoul.metrics import Metrics
+from mahjongsoul.retry import HostGuard, RetryPolicy
+from mahjongsoul.store import GameStore
+
+# numpy, pandas and xlsxwriter (helper, standings, export, report, monitor),
+# asyncio and aiohttp (asyncmanager) and multiprocessing are imported by the
+# functions that need them, the admin commands start without them
+if typing.TYPE_CHECKING:
+    from mahjongsoul.helper import Games, PlayerPool, Teams
+    from mahjongsoul.standings import Standings
 
 env_path = join(dirname(__file__), 'config.env')
 dotenv.load_dotenv(env_path)
-DAYS = ["一","二","三","四","五","六","日"]
 
 def readTeams(filename="teams.json"):
     with open(join(dirname(__file__), filename), encoding="utf-8") as f:
         teams = json.loads(f.read())
     return teams
 
-def color_strtoint(color_str):
-    try:
-        assert len(color_str) == 6
-    except:
-        return -1, -1, -1
-    return int(color_str[0:2], 16), int(color_str[2:4], 16), int(color_str[4:6], 16)
+async def fetchTeamMembers(manager: ContestManager, team_ids, max_concurrency=8):
+    from mahjongsoul.asyncmanager import AsyncContestManager, AsyncTournamentAPI
+    async with AsyncTournamentAPI(manager.api, max_concurrency=max_concurrency) as api:
+        async_manager = AsyncContestManager(manager.contest_unique_id, api, manager.game_type, season_id=manager.season_id)
+        return await async_manager.get_all_team_members(team_ids)
 
-def main():
-    print("Logging in to Majsoul Contest Dashboard...")
-    hbr1_login = TournamentLogin(mjs_email=os.environ.get('mjs_email'), mjs_pw=os.environ.get('mjs_passwd'))
-    print(f"Locating Contest {os.environ.get('contest_unique_id')}...")
-    hbr1_manager = ContestManager(os.environ.get('contest_unique_id'), hbr1_login, "Heaven Burns Red")
-    print("Contest found! Setting up...")
-    hbr1_teams = Teams(os.environ.get('contest_unique_id'))
-    hbr1_players = PlayerPool(os.environ.get('contest_unique_id'))
-    hbr1_games = Games(os.environ.get('contest_unique_id'))
+def loadTeams(manager: ContestManager, teams: Teams, players: PlayerPool):
+    import asyncio
+    from mahjongsoul.helper import Player, Team
     print("Fetching teams list...")
-    teams_rawdata = hbr1_manager.get_teams()
-    i_count = 1
-    for team in (teams_list := teams_rawdata["list"]):
-        print(f"Loading team {team['name']} ({i_count}/{teams_rawdata['total']})")
-        members = hbr1_manager.get_team_members(team_id=team["team_id"])["list"]
-        hbr1_teams.addTeam(Team(team['team_id'], team['name'], [p['nickname'] for p in members], team['detail']))
+    teams_rawdata = manager.get_teams()
+    teams_list = teams_rawdata["list"]
+    print(f"Loading {teams_rawdata['total']} teams...")
+    teams_members = asyncio.run(fetchTeamMembers(manager, [team["team_id"] for team in teams_list], int(os.environ.get('fetch_concurrency') or 8)))
+    for team, team_members in zip(teams_list, teams_members):
+        members = team_members["list"]
+        teams.addTeam(Team(team['team_id'], team['name'], [p['account_id'] for p in members], team['detail']))
         for m in members:
-            m["account_data"] = json.loads(m["account_data"])
-            hbr1_players.addPlayer(player := Player(m, team=team['name']))
+            # the stats are rebuilt from the game log, so the member's account_data is not decoded
+            players.addPlayer(Player({'account_id': m['account_id'], 'nickname': m['nickname']}, team=team['name']))
             print(f"Added player {m['nickname']} to {team['name']}")
-        i_count += 1
-    
-    print("Fetching game logs...")
-    no_of_logs = int(hbr1_manager.get_logs()["total"])
-    game_logs = hbr1_manager.get_logs(limit=no_of_logs+1)["record_list"]
-
-    for game_record in game_logs:
-        hbr1_games.addGameFromDict(game_record)
-    
-    print("Handling ties...")
-    modifiers = hbr1_games.getModified()
-    for p_nickname, modifier_list in modifiers.items():
-        for modifier in modifier_list:
-            hbr1_players.modifyPlayerPt(p_nickname, modifier["point"])
-            hbr1_players.modifyPlayerRank(p_nickname, modifier["rank"])
+    return teams_list
+
+def openLogin():
+    retry_policy = RetryPolicy(max_attempts=int(os.environ.get('retry_attempts') or 4), base=float(os.environ.get('retry_backoff') or 0.5))
+    guard = HostGuard(default_rate=float(os.environ.get('api_rate_limit') or 10))
+    login = TournamentLogin(mjs_email=os.environ.get('mjs_email'), mjs_pw=os.environ.get('mjs_passwd'), pool_size=int(os.environ.get('http_pool_size') or 10), timeout=float(os.environ.get('http_timeout') or 30),
+                            token_file=tokenFile(), endpoint=os.environ.get('api_endpoint') or None, retry_policy=retry_policy, guard=guard)
+    recordApi(login)
+    return login
+
+def recordApi(api: TournamentAPI):
+    # capture the responses for offline replays (see bench.py)
+    if recording := os.environ.get('api_recording'):
+        from mahjongsoul.replay import ApiRecorder
+        api.recorder = ApiRecorder(join(dirname(__file__), recording))
+
+def writeMetrics(metrics: Metrics):
+    if metrics_filename := os.environ.get('metrics_file'):
+        metrics.write(join(dirname(__file__), metrics_filename), os.environ.get('metrics_format') or "jsonl")
+
+def contestTz():
+    # fixed utc offset (hours) the contest's match days are counted in, UTC+8 by default
+    return datetime.timezone(datetime.timedelta(hours=float(os.environ.get('contest_utc_offset') or 8)))
+
+def advancingTeams():
+    return int(os.environ.get('advancing_teams') or 6)
+
+def openManager(login: TournamentLogin, contest_unique_id=None, season_id=None, cache: ResponseCache = None):
+    return ContestManager(contest_unique_id or os.environ.get('contest_unique_id'), login, "Heaven Burns Red", cache=cache, season_id=season_id)
+
+def tokenFile():
+    if token_filename := os.environ.get('login_token_file'):
+        return join(dirname(__file__), token_filename)
+
+def openGameStore(manager: ContestManager):
+    if store_filename := os.environ.get('game_store'):
+        return GameStore(join(dirname(__file__), store_filename), manager.contest_unique_id, manager.season_id)
+
+def loadGames(manager: ContestManager, games: Games, store: GameStore = None):
+    page_size, prefetch = int(os.environ.get('log_page_size') or 100), int(os.environ.get('log_prefetch') or 0)
+    if store is not None:
+        total = int(manager.get_logs(offset=0, limit=1)["total"])
+        new_logs = list(manager.iter_logs(page_size=page_size, prefetch=prefetch, known_uuids=store.known_uuids()))
+        store.add_records(new_logs)
+        print(f"{len(new_logs)} new game(s), {len(store)} in local store")
+        # older records the store missed are never fetched incrementally, only the whole log brings them back
+        if len(store) < total:
+            print(f"Local store is missing {total - len(store)} game(s), fetching the whole season again")
+            store.replace_records(list(manager.iter_logs(page_size=page_size, prefetch=prefetch)))
+        games.addGamesFromIter(store.iter_records())
+    else:
+        games.addGamesFromIter(manager.iter_logs(page_size=page_size, prefetch=prefetch))
+
+def checkpointStandings(games: Games, store: GameStore):
+    """
+    snapshot the standings of the match days finished since the last run,
+    see `StandingsHistory`
+    """
+    from mahjongsoul.standings import StandingsHistory
+    history = StandingsHistory.load(store)
+    if snapshots := history.checkpoint(games):
+        history.save(store, snapshots)
+        print(f"Saved the standings of {len(snapshots)} match day(s)")
+    return history
+
+def main():
+    from mahjongsoul.export import exportTables, parseFormats
+    from mahjongsoul.standings import Standings
+    contest_tz = contestTz()
+    output_formats = parseFormats(os.environ.get('output_formats'))
+    metrics = Metrics()
+    with metrics.stage("login"):
+        print("Logging in to Majsoul Contest Dashboard...")
+        hbr1_login = openLogin()
+        hbr1_login.metrics = metrics
+        print(f"Locating Contest {os.environ.get('contest_unique_id')}...")
+        hbr1_manager = openManager(hbr1_login)
+        metrics.watch_cache(hbr1_manager.cache)
+    print("Contest found! Setting up...")
+    try:
+        hbr1_teams, hbr1_players, hbr1_games, teams_list, _ = fetchContest(hbr1_manager, contest_tz, metrics)
+    finally:
+        hbr1_login.close()
 
     print("Generating spreadsheets...")
+    with metrics.stage("standings"):
+        standings = Standings.fromGames(hbr1_players, hbr1_teams, hbr1_games, advancing=advancingTeams())
+    with metrics.stage("tables"):
+        tables = buildTables(standings, hbr1_players, hbr1_teams, hbr1_games, teams_list)
+
+    time_now = datetime.datetime.now(tz=contest_tz)
+    output_basename = os.environ.get('output_filename')+time_now.strftime("_%Y%m%d_%H%M%S")
+    with metrics.stage("export"):
+        for filename in exportTables({name: tables[name] for name in ("players", "teams", "logs")}, output_basename, output_formats):
+            print(f"Wrote {filename}")
+    if "xlsx" in output_formats:
+        print("Writing to spreadsheet...")
+        with metrics.stage("xlsx"):
+            writeReport(output_basename+".xlsx", tables, hbr1_players, hbr1_teams, hbr1_games, time_now)
+    writeMetrics(metrics)
+
+def buildTables(standings: Standings, players: PlayerPool, teams: Teams, games: Games, teams_list):
+    """
+    the report's tables: players (by ranking), players_by_team, teams and logs
+    """
+    import pandas as pd
     #data_cols = ["队伍","选手","积分","试合数","平顺","1着","2着","3着","4着","TOP率","连对率","避四率","最高分"]
-    df1 = pd.DataFrame(data=hbr1_players.exportToDict())
+    df1 = pd.DataFrame(data=standings.exportToDict())
     df1 = df1.round({'平顺': 2, 'TOP率': 4, '连对率': 4, '避四率': 4})
-    df2 = pd.DataFrame(data=hbr1_games.exportToDict())
 
     print("Generating individual stats")
     df1['队伍'] = pd.Categorical(df1['队伍'], [team['name'] for team in teams_list])
-    df1_individual = df1.sort_values(by='积分', ascending=False).reset_index(drop=True)
+    # rows already come in ranking order
+    df1_individual = df1.copy()
     df1_individual.index = df1_individual.index + 1
     print("Generating team stats by player")
-    df1_team = df1_individual.sort_values(by=['队伍', '积分'], ascending=[True, False]).reset_index(names='排名')
+    df1_team = df1_individual.sort_values(by=['队伍', '积分'], ascending=[True, False], kind="stable").reset_index(names='排名')
     print("Generating team scores")
-    df1_teamTotal = df1_team.groupby('队伍', observed=True).agg({'积分': 'sum','试合数': 'sum','1着': 'sum','2着': 'sum','3着': 'sum','4着': 'sum'}).sort_values(by='积分', ascending=False).reset_index(names='队伍')
-    df1_teamTotal.insert(2,"差值",-df1_teamTotal['积分'].diff())
-
-    cutoff = df1_teamTotal['积分'].copy()
-    cutoff.iloc[:6] = df1_teamTotal['积分'].iloc[:6] - df1_teamTotal.loc[6, '积分']
-    cutoff.iloc[6:] = df1_teamTotal['积分'].iloc[6:] - df1_teamTotal.loc[5, '积分']
-    df1_teamTotal.insert(3, "晋级线", cutoff)
-
+    df1_teamTotal = pd.DataFrame(data=standings.exportTeamsToDict())
     df1_teamTotal.index = df1_teamTotal.index + 1
 
     df1_individual.index.name = '排名'
     df1_teamTotal.index.name = '排名'
 
     print("Generating logs")
-    df2 = pd.DataFrame(data=hbr1_games.exportToDict())
-    df2.insert(3,"1位队伍",df2['1位玩家'].apply(lambda x: hbr1_teams.getPlayerTeam(x)))
-    df2.insert(7,"2位队伍",df2['2位玩家'].apply(lambda x: hbr1_teams.getPlayerTeam(x)))
-    df2.insert(11,"3位队伍",df2['3位玩家'].apply(lambda x: hbr1_teams.getPlayerTeam(x)))
-    df2.insert(15,"4位队伍",df2['4位玩家'].apply(lambda x: hbr1_teams.getPlayerTeam(x)))
-
-    print("Writing to spreadsheet...")
-    time_now = datetime.datetime.now(tz=(beijing_time := CNTZ()))
-    ContrastColor = lambda r,g,b: "000000" if (0.299 * r + 0.587 * g + 0.114 * b)/255 > 0.5 else "ffffff"
-    with pd.ExcelWriter((output_filename := os.environ.get('output_filename')+time_now.strftime("_%Y%m%d_%H%M%S")+".xlsx"), engine='xlsxwriter') as writer:
-        df1_team.to_excel(writer, index=False, sheet_name='团体个人表', startrow=1)
-        df1_individual.to_excel(writer, index=True, sheet_name='个人积分表', startrow=1)
-        df1_teamTotal.to_excel(writer, index=True, sheet_name='队伍积分表', startrow=1)
-        df2.to_excel(writer, index=False, sheet_name='牌谱数据')
-
-        # Future step forward: automatic formatting
-        formats = {}
-        workbook = writer.book
-        formats["score"] = workbook.add_format({"bg_color": "#FAF0CE", "font_color": "#000000", "align": "center"})
-        formats["score_red"] = workbook.add_format({"bg_color": "#FAF0CE", "font_color": "#FF0000", "align": "center"})
-        formats["simple_red"] = workbook.add_format({"font_color": "#FF0000", "align": "center"})
-        formats["top"] = workbook.add_format({"bg_color": "#FF66CC", "font_color": "#000000", "align": "center"})
-        formats["title"] = workbook.add_format({"bold": True, "align": "center"})
-        formats["title_red"] = workbook.add_format({"bold": True, "align": "center", "font_color": "#FF0000"})
-        formats["noteL"] = workbook.add_format({"bold": True, "align": "left"})
-        formats["noteR"] = workbook.add_format({"bold": True, "align": "right"})
-        formats["center"] = workbook.add_format({"align": "center", "valign": "vcenter"})
-        for team in hbr1_teams.teams:
-            r,g,b = color_strtoint(team_color := team.color)
-            formats[team.name] = workbook.add_format({"bg_color": f"#{team_color}", "font_color": f"#{ContrastColor(r,g,b)}", "align": "center"})
-        today_matchup = workbook.add_worksheet("每日试合")
-
-        worksheet_individual = writer.sheets['个人积分表']
-        worksheet_individual.set_column(1, 2, 30, formats["center"])
-        worksheet_individual.set_column(3, 5, 8, formats["center"])
-        worksheet_individual.set_column(6, 9, 6, formats["center"])
-        worksheet_individual.set_column(10, 13, 8, formats["center"])
-
-        worksheet_individual.merge_range("A1:N1", "炽焰天穹ML S1 2025  常规赛  个人成绩顺位表", formats["title"])
-        row1, _ = df1_individual.shape
-        worksheet_individual.merge_range(f"A{row1+3}:F{row1+3}", "★各选手出场数最少12个半庄、最多60个半庄", formats["noteL"])
-        worksheet_individual.merge_range(f"G{row1+3}:N{row1+3}", f'{time_now.strftime("%m月%d日")} 终了时点', formats["noteR"])
-
-        for team in hbr1_teams.teams:
-            worksheet_individual.conditional_format(
-                f"B3:C{row1+2}", {"type": "formula", "criteria": f'=$B3="{team.name}"', "format": formats[team.name]}
-            )
-
-        worksheet_individual.conditional_format(
-            f"D3:D{row1+2}", {"type": "cell", "criteria": "<", "value": 0, "format": formats["score_red"]}
-        )
-        worksheet_individual.conditional_format(
-            f"D3:D{row1+2}", {"type": "cell", "criteria": ">=", "value": 0, "format": formats["score"]}
-        )
-        
-        for a in ['G', 'K', 'L', 'M', 'N']:
-             worksheet_individual.conditional_format(
-                f"{a}3:{a}{row1+2}", {"type": "top", "value": 1, "format": formats["top"]}
-            )
-
-        worksheet_team = writer.sheets['团体个人表']
-        worksheet_team.set_column(0, 0, 8, formats["title"])
-        worksheet_team.set_column(1, 2, 30, formats["center"])
-        worksheet_team.set_column(3, 5, 8, formats["center"])
-        worksheet_team.set_column(6, 9, 6, formats["center"])
-        worksheet_team.set_column(10, 13, 8, formats["center"])
-        
-        worksheet_team.merge_range("A1:N1", "炽焰天穹ML S1 2025  常规赛  个人成绩顺位表（按队伍）", formats["title"])
-        row2, _ = df1_team.shape
-        worksheet_team.merge_range(f"A{row2+3}:F{row2+3}", "★各选手出场数最少12个半庄、最多60个半庄", formats["noteL"])
-        worksheet_team.merge_range(f"G{row2+3}:N{row2+3}", f'{time_now.strftime("%m月%d日")} 终了时点', formats["noteR"])
-
-        for team in hbr1_teams.teams:
-            worksheet_team.conditional_format(
-                f"B3:C{row2+2}", {"type": "formula", "criteria": f'=$B3="{team.name}"', "format": formats[team.name]}
-            )
-
-        worksheet_team.conditional_format(
-            f"D3:D{row2+2}", {"type": "cell", "criteria": "<", "value": 0, "format": formats["score_red"]}
-        )
-        worksheet_team.conditional_format(
-            f"D3:D{row2+2}", {"type": "cell", "criteria": ">=", "value": 0, "format": formats["score"]}
-        )
-
-        worksheet_teamTotal = writer.sheets['队伍积分表']
-        worksheet_teamTotal.set_column(1, 1, 30, formats["center"])
-        worksheet_teamTotal.set_column(2, 5, 8, formats["center"])
-        worksheet_teamTotal.set_column(6, 9, 6, formats["center"])
-        
-        worksheet_teamTotal.merge_range("A1:J1", "炽焰天穹ML S1 2025  常规赛  队伍积分顺位表", formats["title"])
-        row3, _ = df1_teamTotal.shape
-        worksheet_teamTotal.merge_range(f"D{row3+3}:J{row3+3}", f'{time_now.strftime("%m月%d日")} 终了时点', formats["noteR"])
-
-        for team in hbr1_teams.teams:
-            worksheet_teamTotal.conditional_format(
-                f"B3:B{row3+2}", {"type": "cell", "criteria": "==", "value": f'"{team.name}"', "format": formats[team.name]}
-            )
-
-        worksheet_teamTotal.conditional_format(
-            f"C3:C{row3+2}", {"type": "cell", "criteria": "<", "value": 0, "format": formats["score_red"]}
-        )
-        worksheet_teamTotal.conditional_format(
-            f"C3:C{row3+2}", {"type": "cell", "criteria": ">=", "value": 0, "format": formats["score"]}
-        )
-        worksheet_teamTotal.conditional_format(
-            f"E3:E{row3+2}", {"type": "cell", "criteria": "<", "value": 0, "format": formats["simple_red"]}
-        )
-
-        worksheet_paifu = writer.sheets['牌谱数据']
-        worksheet_paifu.set_column(0, 1, 18, formats["center"])
-        for i in range(2,17,4):
-            worksheet_paifu.set_column(i, i+1, 20, formats["center"])
-            worksheet_paifu.set_column(i+2, i+3, 12, formats["center"])
-        row4, _ = df2.shape
-        
-        for team in hbr1_teams.teams:
-            worksheet_paifu.conditional_format(
-                f"C2:F{row4+1}", {"type": "formula", "criteria": f'=$D2="{team.name}"', "format": formats[team.name]}
-            )
-            worksheet_paifu.conditional_format(
-                f"G2:J{row4+1}", {"type": "formula", "criteria": f'=$H2="{team.name}"', "format": formats[team.name]}
-            )
-            worksheet_paifu.conditional_format(
-                f"K2:N{row4+1}", {"type": "formula", "criteria": f'=$L2="{team.name}"', "format": formats[team.name]}
-            )
-            worksheet_paifu.conditional_format(
-                f"O2:R{row4+1}", {"type": "formula", "criteria": f'=$P2="{team.name}"', "format": formats[team.name]}
-            )
-        
-        last_games = hbr1_games.getGameFromTime(last_gametime := hbr1_games.game_list[0].start_time)[::-1]
-        today_matchup.set_column(0, 4, 20)
-        today_matchup.write('A1', f'{last_gametime.strftime("%m/%d")} (周{DAYS[last_gametime.weekday()]})', formats["title_red"])
-        teams = set([hbr1_teams.getPlayerTeam(p["nickname"]) for x in last_games for p in x.players])
-        teams_game = [set([hbr1_teams.getPlayerTeam(p["nickname"]) for p in last_games[0].players])]
-        if (len(teams) > 4):
-            teams_game.append(teams - teams_game[0])
-        
-        for i in range(len(teams_game)):
-            i_0 = 10*i+2
-            x = 0
-            teams_game_tmp = list(teams_game[i])
-            for k in range(4):
-                teamname_tmp = teams_game_tmp[k]
-                today_matchup.write(i_0-2, k+1, teamname_tmp, formats[teamname_tmp])
-            today_matchup.write(f'A{i_0}', "第1半庄", formats["title"])
-            today_matchup.write(f'A{i_0+4}', "第2半庄", formats["title"])
-            for j in range(2):
-                today_matchup.write(f'A{i_0+4*j+1}', "马点", formats["title"])
-                today_matchup.write(f'A{i_0+4*j+2}', "分数", formats["title"])
-                today_matchup.write(f'A{i_0+4*j+3}', "赛事牌谱", formats["title"])
-            
-            for u in range(n_last_games := len(last_games)):
-                if hbr1_teams.getPlayerTeam(last_games[u].players[0]["nickname"]) in teams_game_tmp:
-                    players_team = [hbr1_teams.getPlayerTeam(p["nickname"]) for p in last_games[u].players]
-                    players_idx = [teams_game_tmp.index(p) for p in players_team]
-                    for y in range(len(players_idx)):
-                        today_matchup.write(i_0-1+4*x, players_idx[y]+1, last_games[u].players[y]["nickname"], formats[players_team[y]])
-                        today_matchup.write(i_0+4*x, players_idx[y]+1, last_games[u].players[y]["part_point_1"], formats[players_team[y]])
-                        today_matchup.write(i_0+1+4*x, players_idx[y]+1, last_games[u].players[y]["total_point"] / 1000, formats[players_team[y]])
-                    today_matchup.merge_range(f"B{i_0+3+4*x}:E{i_0+3+4*x}", "https://game.maj-soul.com/1/?paipu="+last_games[u].uuid, formats["score"])
-                    x += 1
+    df2 = pd.DataFrame(data=games.exportToDict(players=players, teams=teams))
+    return {"players": df1_individual, "players_by_team": df1_team, "teams": df1_teamTotal, "logs": df2}
+
+def writeReport(filename, tables, players: PlayerPool, teams: Teams, games: Games, time_now):
+    from mahjongsoul.report import ReportWriter
+    with ReportWriter(filename, teams, time_now, note="★各选手出场数最少12个半庄、最多60个半庄") as report:
+        report.writePlayers('团体个人表', tables["players_by_team"], "炽焰天穹ML S1 2025  常规赛  个人成绩顺位表（按队伍）", index=False, highlight_top=False)
+        report.writePlayers('个人积分表', tables["players"], "炽焰天穹ML S1 2025  常规赛  个人成绩顺位表", index=True, highlight_top=True)
+        report.writeTeamTotal('队伍积分表', tables["teams"], "炽焰天穹ML S1 2025  常规赛  队伍积分顺位表")
+        report.writeLogs('牌谱数据', tables["logs"])
+        last_games = [games.getGame(i) for i in games.getGameFromTime(games.getGame(games.getLatestGame()).start_time)[::-1]] if len(games) else []
+        report.writeMatchup("每日试合", last_games, teams, players)
+
+def parseTargets(value: str):
+    """
+    batch_targets: "8406032:2, 917124" -> [("8406032", 2), ("917124", None)],
+    a contest without a season stands for its running season
+    """
+    targets = []
+    for target in value.replace(",", " ").split():
+        contest_unique_id, _, season_id = target.partition(":")
+        targets.append((contest_unique_id, int(season_id) if season_id else None))
+    return list(dict.fromkeys(targets))
+
+def fetchContest(manager: ContestManager, contest_tz, metrics: Metrics = None):
+    """
+    teams, players and games of the manager's contest season, and the
+    standings history, checkpointed in the game store when there is one
+    (empty otherwise)
+    """
+    from mahjongsoul.helper import Games, PlayerPool, Teams
+    from mahjongsoul.standings import StandingsHistory
+    metrics = metrics or Metrics()
+    contest_unique_id = manager.contest_unique_id
+    teams, players, games = Teams(contest_unique_id), PlayerPool(contest_unique_id), Games(contest_unique_id, contest_tz)
+    with metrics.stage("teams"):
+        teams_list = loadTeams(manager, teams, players)
+    print("Fetching game logs...")
+    with metrics.stage("logs"):
+        if (store := openGameStore(manager)) is not None:
+            with store:
+                loadGames(manager, games, store)
+                history = checkpointStandings(games, store)
+        else:
+            loadGames(manager, games)
+            history = StandingsHistory()
+    return teams, players, games, teams_list, history
+
+def buildReport(teams: Teams, players: PlayerPool, games: Games, teams_list, output_basename, output_formats, time_now):
+    """
+    the report files of one fetched contest, run in a worker process by
+    `batch`. returns the files written and the durations of the stages
+    """
+    from mahjongsoul.export import exportTables
+    from mahjongsoul.standings import Standings
+    metrics = Metrics()
+    with metrics.stage("standings"):
+        standings = Standings.fromGames(players, teams, games, advancing=advancingTeams())
+    with metrics.stage("tables"):
+        tables = buildTables(standings, players, teams, games, teams_list)
+    with metrics.stage("export"):
+        files = exportTables({name: tables[name] for name in ("players", "teams", "logs")}, output_basename, output_formats)
+    if "xlsx" in output_formats:
+        with metrics.stage("xlsx"):
+            writeReport(output_basename+".xlsx", tables, players, teams, games, time_now)
+        files.append(output_basename+".xlsx")
+    return files, {name: stage["seconds"] for name, stage in metrics.snapshot()["stages"].items()}
+
+def batch():
+    """
+    reports of every (contest, season) of batch_targets. the targets are
+    fetched by `batch_fetch_workers` threads sharing one login (so one
+    connection pool, token and rate limit) and one response cache, and each
+    report is built in a worker process as soon as its games are in
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from mahjongsoul.export import parseFormats
+    contest_tz = contestTz()
+    targets = parseTargets(os.environ.get('batch_targets') or "")
+    if not targets:
+        print("No batch_targets configured")
+        return
+    output_formats = parseFormats(os.environ.get('output_formats'))
+    metrics = Metrics()
+    print("Logging in to Majsoul Contest Dashboard...")
+    login = openLogin()
+    login.metrics = metrics
+    cache = ResponseCache(ContestManager.CACHE_TTL)
+    metrics.watch_cache(cache)
+    summary = {target: {"season": target[1], "games": None, "fetch": None, "build": None, "result": ""} for target in targets}
+    # "8406032" and "8406032:2" are the same report while season 2 is running
+    fetched_seasons, fetched_lock = set(), threading.Lock()
+    started = time.perf_counter()
+
+    # spawned, forking would copy locks held by the fetching threads into the workers
+    builders = ProcessPoolExecutor(max_workers=int(os.environ.get('batch_workers') or 0) or None, mp_context=multiprocessing.get_context("spawn"))
+    def fetch(target):
+        contest_unique_id, season_id = target
+        fetch_started = time.perf_counter()
+        manager = openManager(login, contest_unique_id, season_id, cache)
+        season_id = manager.season_id
+        summary[target]["season"] = season_id
+        # checked before fetching, a duplicate must not cost a whole season's log
+        with fetched_lock:
+            if (contest_unique_id, season_id) in fetched_seasons:
+                raise ValueError(f"season {season_id} of contest {contest_unique_id} is already a target")
+            fetched_seasons.add((contest_unique_id, season_id))
+        teams, players, games, teams_list, _ = fetchContest(manager, contest_tz, metrics)
+        summary[target].update(games=len(games), fetch=time.perf_counter() - fetch_started)
+        time_now = datetime.datetime.now(tz=contest_tz)
+        output_basename = os.environ.get('output_filename')+f"_{contest_unique_id}_s{season_id}"+time_now.strftime("_%Y%m%d_%H%M%S")
+        return builders.submit(buildReport, teams, players, games, teams_list, output_basename, output_formats, time_now)
+    try:
+        with builders, ThreadPoolExecutor(max_workers=int(os.environ.get('batch_fetch_workers') or 2)) as fetchers:
+            fetches = {target: fetchers.submit(fetch, target) for target in targets}
+            for target, fetched in fetches.items():
+                try:
+                    files, stages = fetched.result().result()
+                    summary[target].update(build=sum(stages.values()), result=", ".join(files))
+                except Exception as e:
+                    summary[target]["result"] = f"failed: {e!r}"
+    finally:
+        login.close()
+
+    fmt = lambda v, spec: format(v, spec) if v is not None else "-"
+    print(f"{'contest':<12}{'season':>8}{'games':>8}{'fetch (s)':>11}{'build (s)':>11}  files")
+    for (contest_unique_id, _), entry in summary.items():
+        print(f"{contest_unique_id:<12}{fmt(entry['season'], 'd'):>8}{fmt(entry['games'], 'd'):>8}{fmt(entry['fetch'], '.2f'):>11}{fmt(entry['build'], '.2f'):>11}  {entry['result']}")
+    runs = sum((entry["fetch"] or 0) + (entry["build"] or 0) for entry in summary.values())
+    print(f"{len(targets)} target(s) in {time.perf_counter() - started:.2f}s, {runs:.2f}s one after another")
+    writeMetrics(metrics)
+
+async def runMonitor(manager: ContestManager, games: Games, standings: Standings, store: GameStore = None, metrics: Metrics = None):
+    from mahjongsoul.asyncmanager import AsyncContestManager, AsyncTournamentAPI
+    from mahjongsoul.monitor import ContestMonitor
+    metrics = metrics or Metrics()
+    def printEvent(event):
+        if event["type"] == "game_ended":
+            with metrics.stage("standings_update"):
+                standings.applyGame(games, event["row"])
+            writeMetrics(metrics)
+            game = games.getGame(event["row"])
+            print(f'[{event["type"]}] {event["uuid"]}: ' + ", ".join(f'{p["nickname"]} {p["part_point_1"]}' for p in game.players))
+            team_table = standings.exportTeamsToDict()
+            print("  " + " | ".join(f"{i+1}. {name} {points:.1f}" for i, (name, points) in enumerate(zip(team_table["队伍"], team_table["积分"]))))
+        else:
+            print(f'[{event["type"]}] {event["uuid"]}: ' + str({k: v for k, v in event.items() if k not in ("type", "uuid")}))
+    async with AsyncTournamentAPI(manager.api, max_concurrency=int(os.environ.get('fetch_concurrency') or 8)) as api:
+        async_manager = AsyncContestManager(manager.contest_unique_id, api, manager.game_type, season_id=manager.season_id)
+        monitor = ContestMonitor(async_manager, games, on_event=printEvent, store=store, poll_interval=float(os.environ.get('monitor_interval') or 10))
+        await monitor.run()
+
+def monitor():
+    import asyncio
+    from mahjongsoul.helper import Games, PlayerPool, Teams
+    from mahjongsoul.standings import Standings
+    contest_tz = contestTz()
+    print("Logging in to Majsoul Contest Dashboard...")
+    hbr1_login = openLogin()
+    metrics = Metrics()
+    hbr1_login.metrics = metrics
+    hbr1_manager = openManager(hbr1_login)
+    metrics.watch_cache(hbr1_manager.cache)
+    hbr1_teams = Teams(os.environ.get('contest_unique_id'))
+    hbr1_players = PlayerPool(os.environ.get('contest_unique_id'))
+    hbr1_games = Games(os.environ.get('contest_unique_id'), contest_tz)
+    loadTeams(hbr1_manager, hbr1_teams, hbr1_players)
+    print("Fetching game logs...")
+    store = openGameStore(hbr1_manager)
+    try:
+        loadGames(hbr1_manager, hbr1_games, store)
+        standings = Standings.fromGames(hbr1_players, hbr1_teams, hbr1_games, advancing=advancingTeams())
+        print(f"Monitoring contest {hbr1_manager.contest_unique_id}, press Ctrl+C to stop")
+        asyncio.run(runMonitor(hbr1_manager, hbr1_games, standings, store, metrics))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if store is not None:
+            store.close()
+        hbr1_login.close()
+
+def standingsAt(when: str):
+    """
+    print the standings as of `when`: the end of a day (2025-07-01) or a
+    moment (2025-07-01T20:00, in the contest's timezone unless given)
+    """
+    contest_tz = contestTz()
+    try:
+        moment = datetime.date.fromisoformat(when)
+    except ValueError:
+        moment = datetime.datetime.fromisoformat(when)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=contest_tz)
+    login = openLogin()
+    try:
+        teams, players, games, _, history = fetchContest(openManager(login), contest_tz)
+    finally:
+        login.close()
+    standings = history.standingsAt(players, teams, games, moment, advancing=advancingTeams())
+    print(f"Standings as of {when}:")
+    team_table = standings.exportTeamsToDict()
+    for i, (name, points, count) in enumerate(zip(team_table["队伍"], team_table["积分"], team_table["试合数"])):
+        print(f"  {i+1}. {name} {points:.1f} ({count} games)")
+    player_table = standings.exportToDict()
+    for i, (nickname, team, points) in enumerate(zip(player_table["选手"], player_table["队伍"], player_table["积分"])):
+        print(f"  {i+1}. {nickname} [{team}] {points:.1f}")
+
+def admin(action: str, nickname: str):
+    login = openLogin()
+    try:
+        manager = openManager(login)
+        ok, message = {"pause": manager.pause_game, "unpause": manager.unpause_game, "terminate": manager.terminate_game}[action](nickname)
+    except ContestAPIError as e:
+        # these commands are run by bots, one line and the exit status is all they read
+        ok, message = False, f"Could not {action} {nickname}'s game: {e}"
+    finally:
+        login.close()
+    print(message)
+    return 0 if ok else 1
+
+def schedule(filename: str):
+    """
+    plan the tables of a json file (or stdin for "-"), a list of `start_game`
+    keyword arguments, and print one json report per table
+    """
+    if filename == "-":
+        tables = json.load(sys.stdin)
+    else:
+        with open(filename, encoding="utf-8") as f:
+            tables = json.load(f)
+    login = openLogin()
+    try:
+        manager = openManager(login)
+        reports = manager.schedule_games(tables, max_concurrency=int(os.environ.get('fetch_concurrency') or 8))
+    except ContestAPIError as e:
+        print(f"Could not schedule the games: {e}")
+        return 1
+    finally:
+        login.close()
+    for report in reports:
+        print(json.dumps(report, ensure_ascii=False))
+    return 0 if all(report["ok"] for report in reports) else 1
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Majsoul contest stats and admin commands, settings are read from config.env")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.add_parser("report", help="write the report of the running season (the default)")
+    commands.add_parser("batch", help="write the reports of every batch_targets contest and season")
+    commands.add_parser("monitor", help="follow the running games and update the standings as they end")
+    commands.add_parser("standings", help="print the standings as of a past day or moment").add_argument("when", help="2025-07-01 for the end of that day, or 2025-07-01T20:00")
+    for action, description in (("pause", "pause the running game of a player"), ("unpause", "resume the paused game of a player"), ("terminate", "end the running game of a player")):
+        commands.add_parser(action, help=description).add_argument("nickname")
+    commands.add_parser("schedule", help="plan games, see `ContestManager.schedule_games`").add_argument("file", help='json list of start_game arguments, one per table, "-" for stdin')
+    return parser.parse_args(argv)
+
+def cli(argv=None) -> int:
+    args = parseArgs(argv)
+    if args.command in (None, "report"):
+        main()
+    elif args.command == "batch":
+        batch()
+    elif args.command == "monitor":
+        monitor()
+    elif args.command == "standings":
+        standingsAt(args.when)
+    elif args.command == "schedule":
+        return schedule(args.file)
+    else:
+        return admin(args.command, args.nickname)
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(cli())